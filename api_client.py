@@ -4,10 +4,10 @@ This module provides functions for interacting with the Gemini API.
 """
 import os
 import logging
+from functools import lru_cache
 from typing import Tuple, Dict, Any, Optional, List
 
 import streamlit as st
-import google.generativeai as genai
 from jinja2 import Template
 
 from config import GEMINI_MODELS, DEFAULT_MODEL
@@ -76,6 +76,10 @@ def initialize_gemini(model_name: Optional[str] = None) -> Tuple[Any, Optional[s
         return None, error_message, None
 
     try:
+        # The SDK is only needed to build a client; the prompt and response
+        # helpers below are imported by the processor without it
+        import google.generativeai as genai
+        
         # Configure the API key
         genai.configure(api_key=api_key)
         
@@ -92,6 +96,9 @@ def initialize_gemini(model_name: Optional[str] = None) -> Tuple[Any, Optional[s
             
             def upload(self, file, config):
                 return genai.upload_file(file, mime_type=config.get("mimeType"))
+            
+            def delete(self, name):
+                return genai.delete_file(name)
         
         client = GeminiClient()
         
@@ -127,9 +134,35 @@ def initialize_gemini(model_name: Optional[str] = None) -> Tuple[Any, Optional[s
         logging.error(f"Gemini initialization error: {sanitized_error}")
         return None, sanitized_error, None
 
+@st.cache_resource(show_spinner=False)
+def _cached_gemini_client(model_name: Optional[str]) -> Tuple[Any, str]:
+    """Create the Gemini client once per model; failures raise so they are not cached."""
+    client, error_message, model_id = initialize_gemini(model_name)
+    if not client:
+        raise RuntimeError(error_message)
+    return client, model_id
+
+def get_gemini_client(model_name: Optional[str] = None) -> Tuple[Any, Optional[str], str]:
+    """
+    Get a Gemini client shared across reruns and sessions.
+    The client is built by initialize_gemini on first use for each model.
+    
+    Args:
+        model_name: The name of the Gemini model to use. If None, uses the default.
+        
+    Returns:
+        Tuple (client, error_message, model_name), as returned by initialize_gemini
+    """
+    try:
+        client, model_id = _cached_gemini_client(model_name)
+    except RuntimeError as e:
+        return None, str(e), None
+    return client, None, model_id
+
 def get_transcription_prompt(metadata: Dict[str, Any] = None) -> Template:
     """
     Return the Jinja2 template for transcription prompt.
+    The template is compiled on first use and shared by later calls.
     
     Args:
         metadata: Dictionary of metadata to include in the prompt
@@ -137,6 +170,11 @@ def get_transcription_prompt(metadata: Dict[str, Any] = None) -> Template:
     Returns:
         Jinja2 Template for the transcription prompt
     """
+    return _compiled_prompt_template()
+
+@lru_cache(maxsize=1)
+def _compiled_prompt_template() -> Template:
+    """Compile the transcription prompt template once; it does not vary per request."""
     # Enhanced prompt for better speaker diarization and consistency
     return Template("""TASK: Perform accurate transcription and speaker diarization for the provided {{ metadata.content_type|default('audio file', true) }}.
 
@@ -182,6 +220,42 @@ Only use characters from the English alphabet, unless you genuinely believe fore
 
 It is important that you use the correct words and spell everything correctly. Use the context to help.""")
 
+@st.cache_data(show_spinner=False)
+def _render_prompt(metadata_items: Tuple[Tuple[str, Any], ...], num_speakers: int) -> str:
+    """Render the transcription prompt; cached on the hashable metadata items."""
+    metadata = dict(metadata_items)
+    return get_transcription_prompt(metadata).render(num_speakers=num_speakers, metadata=metadata)
+
+def render_transcription_prompt(metadata: Optional[Dict[str, Any]], num_speakers: int) -> str:
+    """
+    Render the transcription prompt for the given context.
+    Identical metadata and speaker count reuse the previously rendered string.
+    
+    Args:
+        metadata: Dictionary of metadata to include in the prompt
+        num_speakers: Number of speakers in the audio
+        
+    Returns:
+        The rendered prompt text
+    """
+    return _render_prompt(tuple(sorted((metadata or {}).items())), num_speakers)
+
+def extract_response_text(response: Any) -> str:
+    """
+    Extract the transcript text from a Gemini response.
+    
+    Args:
+        response: Response returned by generate_content
+        
+    Returns:
+        The response text, taken from the first candidate part if the
+        response has no top-level text
+    """
+    text = getattr(response, 'text', None)
+    if text is not None:
+        return text
+    return response.candidates[0].content.parts[0].text
+
 def process_audio_chunk(client, model_name: str, chunk_path: str, 
                         prompt: str, mime_type: str, chunk_index: int) -> Tuple[Optional[str], Optional[str]]:
     """
@@ -224,8 +298,7 @@ def process_audio_chunk(client, model_name: str, chunk_path: str,
         
         # Extract transcript text
         try:
-            chunk_text = (chunk_response.text if hasattr(chunk_response, 'text') 
-                          else chunk_response.candidates[0].content.parts[0].text)
+            chunk_text = extract_response_text(chunk_response)
             return chunk_text, None
         except Exception as extract_err:
             error_msg = f"Failed to extract text from chunk {chunk_index+1} response: {str(extract_err)}"
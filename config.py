@@ -31,24 +31,61 @@ MIME_TYPE_MAPPING = {
     "ogg": "audio/ogg"
 }
 
-# Allowed audio file extensions
-ALLOWED_AUDIO_TYPES = ['audio/mpeg', 'audio/wav', 'audio/ogg', 'audio/x-wav']
+# Uploaded file MIME type -> (file format, MIME type sent to Gemini)
+UPLOAD_TYPE_MAPPING = {
+    "audio/mpeg": ("mp3", "audio/mpeg"),
+    "audio/mp3": ("mp3", "audio/mpeg"),  # Reported by some browsers for .mp3
+    "audio/wav": ("wav", "audio/wav"),
+    "audio/x-wav": ("wav", "audio/wav"),
+    "audio/ogg": ("ogg", "audio/ogg")
+}
+
+# Allowed upload MIME types, kept in sync with the mapping above
+ALLOWED_AUDIO_TYPES = list(UPLOAD_TYPE_MAPPING)
 
 # Maximum file size in bytes (200 MB - Streamlit limit)
 MAX_FILE_SIZE = 200 * 1024 * 1024
 
-# File size threshold for chunking (20 MB)
-CHUNK_THRESHOLD_MB = 20
+# Block size used when streaming uploads to disk (1 MB)
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# File size threshold for chunking (20 MB). Larger files are split because a
+# single response's output token limit cannot hold a long transcript, not
+# because the Files API rejects them. Raise it via the environment for models
+# with larger output limits.
+CHUNK_THRESHOLD_MB = float(os.environ.get("TRANSCRIBER_CHUNK_THRESHOLD_MB", 20))
 
 # Chunk duration in milliseconds (2 minutes)
 CHUNK_DURATION_MS = 120000
 
-# Maximum number of worker threads for parallel processing
-MAX_WORKERS = 5
+# Uncompressed formats are re-encoded when chunking to cut upload bandwidth
+# (PCM WAV is ~10 MB per minute, 64 kbps MP3 is under 0.5 MB per minute)
+CHUNK_TRANSCODE_FORMATS = {
+    "wav": "mp3"
+}
+CHUNK_TRANSCODE_BITRATE = "64k"
+
+# Chunks are kept in memory up to this size before spilling to a temporary file
+CHUNK_SPOOL_MAX_SIZE = 50 * 1024 * 1024  # 50 MB
+
+# Chunks whose loudest sample stays below this level are treated as silence and
+# not sent for transcription. Kept conservative so quiet speech is never dropped.
+SILENT_CHUNK_MAX_DBFS = -60.0
+
+# Maximum number of chunks transcribed concurrently. Raise it via the
+# environment when the API quota allows more in-flight requests.
+MAX_WORKERS = int(os.environ.get("TRANSCRIBER_MAX_WORKERS", 5))
+
+# Hard upper bound on concurrent chunk requests, whatever MAX_WORKERS says
+MAX_WORKERS_LIMIT = 32
 
 # Minimum chunk success percentage required before fallback
 MIN_CHUNK_SUCCESS_PERCENTAGE = 0.8
 
+# Number of finished transcripts kept in memory, keyed by audio content hash,
+# so re-running an identical request does not call the API again
+TRANSCRIPT_CACHE_MAX_ENTRIES = 32
+
 # --------- Export Configuration ---------
 # Export format options and their configurations
 EXPORT_FORMATS = {
@@ -69,6 +106,16 @@ EXPORT_FORMATS = {
     }
 }
 
+# --------- Display Configuration ---------
+# Number of transcript lines rendered before the "Show full transcript" toggle
+TRANSCRIPT_PREVIEW_LINES = 500
+
+# Number of rendered transcript views (preview and full) kept in cache
+TRANSCRIPT_HTML_CACHE_MAX_ENTRIES = 4
+
+# Number of formatted exports kept in cache; every edit or format switch adds one
+EXPORT_CACHE_MAX_ENTRIES = 8
+
 # --------- Content Context Options ---------
 CONTENT_TYPES = ["Podcast", "Interview", "Meeting", "Presentation", "Other"]
 LANGUAGES = ["English", "Spanish", "French", "German", "Other"]
@@ -6,7 +6,8 @@ import os
 import tempfile
 import logging
 import shutil
-from typing import List, Tuple, BinaryIO, Union, Optional
+import contextlib
+from typing import Iterator, Tuple, BinaryIO, Union, Optional
 import streamlit as st
 
 from pydub import AudioSegment
@@ -15,7 +16,12 @@ import io
 from config import (
     ALLOWED_AUDIO_TYPES,
     MAX_FILE_SIZE,
-    CHUNK_DURATION_MS
+    CHUNK_DURATION_MS,
+    CHUNK_TRANSCODE_FORMATS,
+    CHUNK_TRANSCODE_BITRATE,
+    CHUNK_SPOOL_MAX_SIZE,
+    COPY_BUFFER_SIZE,
+    SILENT_CHUNK_MAX_DBFS
 )
 
 def validate_audio_file(file) -> bool:
@@ -31,24 +37,28 @@ def validate_audio_file(file) -> bool:
     if file is None:
         return False
 
+    # Reject oversized uploads before anything reads the file contents
+    if file.size > MAX_FILE_SIZE:
+        logging.warning(f"File too large: {file.size / (1024 * 1024):.1f} MB")
+        st.error(f"File exceeds the {MAX_FILE_SIZE // (1024 * 1024)} MB limit.")
+        return False
+
     file_type = file.type
     
     if file_type not in ALLOWED_AUDIO_TYPES:
         logging.warning(f"Invalid file type: {file_type}")
-        return False
-
-    if file.size > MAX_FILE_SIZE:
-        logging.warning(f"File too large: {file.size / (1024 * 1024):.1f} MB")
+        st.error(f"Unsupported file type: {file_type}")
         return False
 
     return True
 
-def create_temp_file(audio_data: bytes, filename: str) -> Tuple[str, bool]:
+def create_temp_file(audio_data: Union[bytes, BinaryIO], filename: str) -> Tuple[str, bool]:
     """
     Create a temporary file with the given audio data.
     
     Args:
-        audio_data: Binary audio data
+        audio_data: Binary audio data, or a file-like object. In-memory buffers
+            are written without copying; other files are streamed in blocks
         filename: Name to use in the temporary file
         
     Returns:
@@ -63,17 +73,23 @@ def create_temp_file(audio_data: bytes, filename: str) -> Tuple[str, bool]:
             
             # Write data using the file descriptor
             with os.fdopen(fd, 'wb') as tmp_file:
-                tmp_file.write(audio_data)
+                if isinstance(audio_data, (bytes, bytearray, memoryview)):
+                    tmp_file.write(audio_data)
+                elif hasattr(audio_data, 'getbuffer'):
+                    # In-memory uploads (BytesIO) are written from a zero-copy view
+                    with audio_data.getbuffer() as view:
+                        tmp_file.write(view)
+                else:
+                    audio_data.seek(0)
+                    shutil.copyfileobj(audio_data, tmp_file, length=COPY_BUFFER_SIZE)
             
             logging.info(f"Created secure temporary file: {file_path}")
             return file_path, True
             
         except Exception as e:
             # Clean up the file if writing failed
-            try:
+            with contextlib.suppress(OSError):
                 os.close(fd)
-            except:
-                pass
             cleanup_file(file_path)
             raise
             
@@ -91,14 +107,16 @@ def cleanup_file(file_path: str) -> bool:
     Returns:
         bool: True if cleanup was successful, False otherwise
     """
-    if not file_path or not os.path.exists(file_path):
+    if not file_path:
         return True
         
     try:
         os.unlink(file_path)
         logging.info(f"Removed temporary file: {file_path}")
         return True
-    except Exception as e:
+    except FileNotFoundError:
+        return True
+    except OSError as e:
         logging.warning(f"Failed to remove temporary file {file_path}: {e}")
         return False
 
@@ -123,118 +141,75 @@ def cleanup_directory(dir_path: str) -> bool:
         logging.warning(f"Failed to remove temporary directory {dir_path}: {e}")
         return False
 
-def chunk_audio_file(audio_data: bytes, file_format: str, 
-                     chunk_duration_ms: int = CHUNK_DURATION_MS) -> Tuple[List[str], int]:
+def iter_audio_chunks(audio_source: Union[str, bytes], file_format: str,
+                      chunk_duration_ms: int = CHUNK_DURATION_MS,
+                      skip_silent: bool = False) -> Iterator[Tuple[int, int, Optional[BinaryIO]]]:
     """
-    Split an audio file into chunks of specified duration.
+    Split audio into in-memory chunks, yielding each one as soon as it is encoded.
+    
+    Callers can start transcribing early chunks while later ones are still
+    being encoded. Each chunk is a rewound SpooledTemporaryFile that stays in
+    memory up to CHUNK_SPOOL_MAX_SIZE; the caller closes it. Chunks that fail
+    to export are logged and not yielded.
     
     Args:
-        audio_data: Binary audio data
+        audio_source: Path to the audio file (read by ffmpeg directly from disk),
+            or binary audio data
         file_format: Format of the audio file (e.g., 'mp3', 'wav')
         chunk_duration_ms: Duration of each chunk in milliseconds
+        skip_silent: If True, chunks peaking below SILENT_CHUNK_MAX_DBFS are not
+            exported and are yielded as None
         
-    Returns:
-        Tuple of (list of paths to temporary chunk files, number of chunks)
+    Yields:
+        Tuple of (chunk index, number of chunks, chunk file or None if silent)
+        
+    Raises:
+        ValueError: If the audio cannot be loaded
     """
-    temp_dir = None
-    chunk_paths = []
-    
+    # Load audio from disk, or from binary data if that is what was passed
+    if isinstance(audio_source, (bytes, bytearray)):
+        audio_source = io.BytesIO(audio_source)
     try:
-        # Load audio from binary data
-        try:
-            audio = AudioSegment.from_file(io.BytesIO(audio_data), format=file_format)
-        except Exception as audio_load_err:
-            error_msg = f"Failed to load audio data: {audio_load_err}"
-            logging.error(error_msg)
-            return [], 0
-        
-        # Get the total length of the audio in milliseconds
-        total_duration = len(audio)
-        
-        # Calculate number of chunks
-        num_chunks = (total_duration // chunk_duration_ms) + (1 if total_duration % chunk_duration_ms > 0 else 0)
-        logging.info(f"Splitting {file_format} audio ({total_duration/1000:.2f} seconds) into {num_chunks} chunks")
-        
-        # Create temporary directory with secure permissions
-        temp_dir = tempfile.mkdtemp(prefix='audio_chunks_')
-        
-        # Set secure permissions immediately
-        try:
-            os.chmod(temp_dir, 0o700)  # Read/write/execute for owner only
-        except Exception as perm_err:
-            logging.warning(f"Could not set permissions on temp directory: {perm_err}")
-            # On Windows or if chmod fails, continue but log warning
-        
-        logging.info(f"Created secure temporary directory for chunks: {temp_dir}")
-        
-        # Split audio into chunks
-        for i in range(num_chunks):
-            try:
-                start_time = i * chunk_duration_ms
-                end_time = min((i + 1) * chunk_duration_ms, total_duration)
-                
-                # Extract chunk
-                chunk = audio[start_time:end_time]
-                
-                # Create temporary file for chunk with secure permissions
-                chunk_filename = f"chunk_{i}.{file_format}"
-                chunk_path = os.path.join(temp_dir, chunk_filename)
-                
-                # Export chunk
-                chunk.export(chunk_path, format=file_format)
-                
-                # Ensure secure permissions (may already be inherited from parent dir)
-                try:
-                    os.chmod(chunk_path, 0o600)  # Read/write for owner only
-                except Exception as file_perm_err:
-                    logging.warning(f"Could not set permissions on chunk file {i}: {file_perm_err}")
-                
-                # Add to list of chunk file paths
-                chunk_paths.append(chunk_path)
-                logging.info(f"Created chunk {i+1}/{num_chunks}: {chunk_path}")
-            except Exception as chunk_err:
-                # Log the error but continue processing other chunks
-                logging.error(f"Error creating chunk {i}: {chunk_err}")
-        
-        if not chunk_paths:
-            raise Exception("Failed to create any valid audio chunks")
-            
-        return chunk_paths, num_chunks
+        audio = AudioSegment.from_file(audio_source, format=file_format)
+    except Exception as audio_load_err:
+        error_msg = f"Failed to load audio data: {audio_load_err}"
+        logging.error(error_msg)
+        raise ValueError(error_msg) from audio_load_err
     
-    except Exception as e:
-        logging.error(f"Error splitting audio file: {e}")
-        # Clean up if an error occurred 
-        if temp_dir and os.path.exists(temp_dir):
-            cleanup_directory(temp_dir)
-        return [], 0
-
-def cleanup_chunks(chunk_paths: List[str]) -> None:
-    """
-    Clean up chunk files and their parent directory.
+    # Get the total length of the audio in milliseconds
+    total_duration = len(audio)
     
-    Args:
-        chunk_paths: List of paths to chunk files
-    """
-    if not chunk_paths:
-        return
-        
-    logging.info(f"Cleaning up {len(chunk_paths)} chunk files...")
-    temp_dir = None
+    # Calculate number of chunks
+    num_chunks = (total_duration // chunk_duration_ms) + (1 if total_duration % chunk_duration_ms > 0 else 0)
+    logging.info(f"Splitting {file_format} audio ({total_duration/1000:.2f} seconds) into {num_chunks} chunks")
     
-    for chunk_path in chunk_paths:
-        if os.path.exists(chunk_path):
-            try: 
-                os.unlink(chunk_path)
-                if not temp_dir:
-                    temp_dir = os.path.dirname(chunk_path)
-            except Exception as e: 
-                logging.warning(f"Failed to remove chunk file {chunk_path}: {e}")
+    # Pick the chunk export format, re-encoding uncompressed audio
+    export_format = CHUNK_TRANSCODE_FORMATS.get(file_format, file_format)
+    export_kwargs = {}
+    if export_format != file_format:
+        export_kwargs["bitrate"] = CHUNK_TRANSCODE_BITRATE
+        logging.info(f"Re-encoding {file_format} chunks as {export_format} ({CHUNK_TRANSCODE_BITRATE})")
     
-    # Try to remove the temp directory if it exists and is empty
-    if temp_dir and os.path.exists(temp_dir):
+    for i in range(num_chunks):
+        start_time = i * chunk_duration_ms
+        end_time = min((i + 1) * chunk_duration_ms, total_duration)
+        chunk = audio[start_time:end_time]
+        
+        # Nothing to transcribe if even the loudest sample is near silence
+        if skip_silent and chunk.max_dBFS < SILENT_CHUNK_MAX_DBFS:
+            logging.info(f"Skipping silent chunk {i+1}/{num_chunks}")
+            yield i, num_chunks, None
+            continue
+        
+        chunk_file = tempfile.SpooledTemporaryFile(max_size=CHUNK_SPOOL_MAX_SIZE)
         try:
-            if not os.listdir(temp_dir): 
-                os.rmdir(temp_dir)
-                logging.info(f"Removed temporary directory: {temp_dir}")
-        except Exception as e:
-            logging.warning(f"Failed to remove temp directory {temp_dir}: {e}")
+            chunk.export(chunk_file, format=export_format, **export_kwargs)
+            chunk_file.seek(0)
+        except Exception as chunk_err:
+            chunk_file.close()
+            # Log the error but continue processing other chunks
+            logging.error(f"Error creating chunk {i}: {chunk_err}")
+            continue
+        
+        logging.info(f"Created in-memory chunk {i+1}/{num_chunks}")
+        yield i, num_chunks, chunk_file
@@ -1,9 +1,10 @@
-import streamlit as st
+import hmac
 import logging
-from typing import Optional
+from typing import Dict, Optional
+
+import streamlit as st
 
 # Import from new module structure
-from api_client import initialize_gemini
 from ui_components import (
     render_model_selection,
     render_context_inputs,
@@ -11,9 +12,9 @@ from ui_components import (
     render_transcript_tabs,
     render_footer
 )
-from transcription_processor import process_transcription_task
-from styles import apply_custom_styles
+from styles import apply_custom_styles, format_transcript_block
 from app_setup import setup_logging, setup_streamlit_page
+from config import TRANSCRIPT_PREVIEW_LINES
 from state_manager import (
     initialize_state,
     get_state,
@@ -40,23 +41,24 @@ def check_password() -> bool:
     # Only show input if password is not correct
     if not get_state("password_correct", False): # Default to False if not found
         # Center the login form with some styling
-        st.markdown("<h3 style='text-align: center; margin-bottom: 20px;'>Audio Transcription</h3>",
-                   unsafe_allow_html=True)
+        st.markdown("<h3 class='centered-title'>Audio Transcription</h3>", unsafe_allow_html=True)
         
         # Create a centered container for the login form
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
             st.markdown("<div class='styled-container'>", unsafe_allow_html=True)
-            st.markdown("<h4 style='text-align: center; margin-bottom: 15px;'>Login</h4>", 
-                       unsafe_allow_html=True)
+            st.markdown("<h4 class='centered-title'>Login</h4>", unsafe_allow_html=True)
             
             # Password input field
             password = st.text_input("Password", type="password", key="password")
             
             # Login button
             if st.button("Login", type="primary"):
-                # Check password
-                if "app_password" in st.secrets and password == st.secrets["app_password"]:
+                # Check password in constant time so response timing does not
+                # reveal how much of a guess matched
+                if "app_password" in st.secrets and hmac.compare_digest(
+                    password.encode(), str(st.secrets["app_password"]).encode()
+                ):
                     set_state("password_correct", True)
                     st.rerun()
                 else:
@@ -71,15 +73,46 @@ def check_password() -> bool:
 
 def handle_transcription_processing(uploaded_file, client, model_name: str) -> None:
     """Handle the transcription processing workflow."""
+    # Imported lazily so pydub and the chunking pipeline are only loaded
+    # once a transcription is actually requested, not on every cold start
+    from transcription_processor import process_transcription_task
+
     # Get metadata from session state using state_manager's get_metadata
     metadata = sm_get_metadata() # Use the specialized getter
     num_speakers = get_state("num_speakers_input", 1)
 
     with st.spinner("Processing your audio file... This might take a while."):
+        # Only shown for chunked files, once the first chunk reports back
+        progress_bar = None
+
+        def update_progress(done: int, total: int) -> None:
+            nonlocal progress_bar
+            text = f"Transcribed {done} / {total} chunks"
+            if progress_bar is None:
+                progress_bar = st.progress(done / total, text=text)
+            else:
+                progress_bar.progress(done / total, text=text)
+
+        # Chunks finish out of order; show what has arrived so far in order
+        partial_chunks: Dict[int, str] = {}
+        partial_view = None
+
+        def show_partial_transcript(index: int, text: str) -> None:
+            nonlocal partial_view
+            partial_chunks[index] = text
+            if partial_view is None:
+                st.caption("Partial transcript, updated as chunks finish:")
+                partial_view = st.empty()
+            partial_text = '\n'.join(partial_chunks[i] for i in sorted(partial_chunks))
+            partial_html, _ = format_transcript_block(partial_text, TRANSCRIPT_PREVIEW_LINES)
+            partial_view.markdown(partial_html, unsafe_allow_html=True)
+
         try:
             # Process transcription
             result = process_transcription_task(
-                client, model_name, uploaded_file, metadata, num_speakers
+                client, model_name, uploaded_file, metadata, num_speakers,
+                progress_callback=update_progress,
+                chunk_callback=show_partial_transcript
             )
 
             if result["success"]:
@@ -88,6 +121,7 @@ def handle_transcription_processing(uploaded_file, client, model_name: str) -> N
                     "transcript_text": result["transcript"],
                     "edited_transcript": result["transcript"],
                     "transcript_editor_content": result["transcript"],
+                    "transcript_editor_seed": None,
                     "processing_status": "complete"
                 })
                 logger.info(f"Transcription successful for file: {uploaded_file.name}")
@@ -141,8 +175,10 @@ def main():
     selected_model_id = render_model_selection() # This function might internally use get/set_state
     st.divider()
 
-    # Initialize Gemini client
-    client, error_message, model_name = initialize_gemini(selected_model_id)
+    # Initialize Gemini client. Imported here so nothing Gemini-related is
+    # loaded before login; the SDK itself is imported when a client is built.
+    from api_client import get_gemini_client
+    client, error_message, model_name = get_gemini_client(selected_model_id)
     if not client:
         st.error(error_message)
         update_processing_state("error", error_message)
@@ -181,7 +217,8 @@ def main():
             "transcript_text": None,
             "edited_transcript": None,
             "error_message": None,
-            "transcript_editor_content": ""
+            "transcript_editor_content": "",
+            "transcript_editor_seed": None
         })
         logger.info(f"Transcription started for file: {uploaded_file.name}")
         st.rerun()
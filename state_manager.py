@@ -5,46 +5,51 @@ This module provides consistent methods for initializing and accessing session s
 import streamlit as st
 import logging
 from typing import Any, Dict, Optional, List
-from dataclasses import dataclass, field
 
-def initialize_state() -> None:
-    """Initialize all required session state variables with default values."""
+# Default values for all session state variables
+DEFAULT_STATE: Dict[str, Any] = {
     # Authentication state
-    _init_state_var("password_correct", False)
+    "password_correct": False,
     
     # Processing state
-    _init_state_var("processing_status", "idle")  # idle, processing, complete, error
-    _init_state_var("error_message", None)
+    "processing_status": "idle",  # idle, processing, complete, error
+    "error_message": None,
     
     # File data
-    _init_state_var("current_file_name", None)
+    "current_file_name": None,
+    "audio_digest": None,  # (file_id, SHA-256) of the last transcribed upload
     
     # Transcript data
-    _init_state_var("transcript_text", None)
-    _init_state_var("edited_transcript", None)
-    _init_state_var("transcript_editor_content", "")
+    "transcript_text": None,
+    "edited_transcript": None,
+    "transcript_editor_content": "",
+    "transcript_editor_seed": None,  # Value the advanced editor was last mounted with
+    "transcript_editor_generation": 0,  # Bumped to remount the advanced editor
+    "edits_saved_notice": False,  # Show "Edits saved!" after the post-save rerun
     
     # Model selection
-    _init_state_var("selected_model_id", None)
-    _init_state_var("model_display_radio", None)
+    "selected_model_id": None,
+    "model_display_radio": None,
     
     # Context information
-    _init_state_var("content_type_select", "Podcast")
-    _init_state_var("language_select", "English")
-    _init_state_var("topic_input", "")
-    _init_state_var("description_input", "")
-    _init_state_var("num_speakers_input", 1)
+    "content_type_select": "Podcast",
+    "language_select": "English",
+    "topic_input": "",
+    "description_input": "",
+    "num_speakers_input": 1,
     
     # Export options
-    _init_state_var("export_format_select", "TXT")
+    "export_format_select": "TXT",
+}
+
+def initialize_state() -> None:
+    """Initialize all required session state variables with default values."""
+    session_state = st.session_state
+    for key, default_value in DEFAULT_STATE.items():
+        session_state.setdefault(key, default_value)
     
     logging.debug("Session state initialized")
 
-def _init_state_var(key: str, default_value: Any) -> None:
-    """Initialize a session state variable if it doesn't exist."""
-    if key not in st.session_state:
-        st.session_state[key] = default_value
-
 def get_state(key: str, default: Any = None) -> Any:
     """
     Safely get a value from session state.
@@ -75,8 +80,9 @@ def update_states(state_dict: Dict[str, Any]) -> None:
     Args:
         state_dict: Dictionary of {key: value} pairs to update
     """
-    for key, value in state_dict.items():
-        st.session_state[key] = value
+    if not state_dict:
+        return
+    st.session_state.update(state_dict)
 
 def reset_transcript_states() -> None:
     """Reset all transcript-related state variables to defaults."""
@@ -84,19 +90,21 @@ def reset_transcript_states() -> None:
         "transcript_text": None,
         "edited_transcript": None,
         "transcript_editor_content": "",
+        "transcript_editor_seed": None,
         "processing_status": "idle",
         "error_message": None
     })
     
-@dataclass
+# Allowed values of the "processing_status" state variable
+VALID_PROCESSING_STATUSES = frozenset({"idle", "processing", "complete", "error"})
+
 class SessionStateValidator:
     """Validates session state values."""
     
     @staticmethod
     def validate_processing_status(status: str) -> bool:
         """Validate processing status value."""
-        valid_statuses = ["idle", "processing", "complete", "error"]
-        return status in valid_statuses
+        return status in VALID_PROCESSING_STATUSES
     
     @staticmethod
     def validate_file_name(filename: Optional[str]) -> bool:
@@ -127,9 +135,10 @@ def get_state_with_validation(key: str, default: Any = None, validator=None) ->
     """
     value = st.session_state.get(key, default)
     
-    if validator and value is not None:
+    # The caller's own default needs no validation
+    if validator and value is not None and value is not default:
         if not validator(value):
-            logging.warning(f"Invalid value for session state key '{key}': {value}")
+            logging.warning("Invalid value for session state key '%s': %s", key, value)
             return default
     
     return value
@@ -149,7 +158,7 @@ def set_state_with_validation(key: str, value: Any, validator=None) -> bool:
     """
     if validator and value is not None:
         if not validator(value):
-            logging.error(f"Validation failed for key '{key}' with value: {value}")
+            logging.error("Validation failed for key '%s' with value: %s", key, value)
             return False
     
     st.session_state[key] = value
@@ -159,22 +168,29 @@ def set_state_with_validation(key: str, value: Any, validator=None) -> bool:
 def get_metadata() -> Dict[str, str]:
     """
     Get the metadata dictionary from the current session state.
-    Filters out None values and handles "Other" selections.
+    Leaves out empty fields and "Other" selections.
     
     Returns:
         Dictionary of metadata for the transcription prompt
     """
-    metadata = {
-        "content_type": get_state("content_type_select").lower() 
-                        if get_state("content_type_select") != "Other" else None,
-        "topic": get_state("topic_input") if get_state("topic_input") else None,
-        "description": get_state("description_input") if get_state("description_input") else None,
-        "language": get_state("language_select") 
-                    if get_state("language_select") != "Other" else None
-    }
-    
-    # Filter out None values
-    return {k: v for k, v in metadata.items() if v is not None}
+    # Read each value once; every lookup goes through the session state proxy
+    session_state = st.session_state
+    content_type = session_state.get("content_type_select")
+    topic = session_state.get("topic_input")
+    description = session_state.get("description_input")
+    language = session_state.get("language_select")
+    
+    # Only set fields have entries
+    metadata = {}
+    if content_type and content_type != "Other":
+        metadata["content_type"] = content_type.lower()
+    if topic:
+        metadata["topic"] = topic
+    if description:
+        metadata["description"] = description
+    if language and language != "Other":
+        metadata["language"] = language
+    return metadata
 
 
 def update_processing_state(status: str, error_message: Optional[str] = None) -> None:
@@ -185,15 +201,13 @@ def update_processing_state(status: str, error_message: Optional[str] = None) ->
         status: New processing status
         error_message: Optional error message
     """
-    validator = SessionStateValidator()
-    
-    if set_state_with_validation("processing_status", status, validator.validate_processing_status):
+    if set_state_with_validation("processing_status", status, SessionStateValidator.validate_processing_status):
         if status == "error" and error_message:
             set_state("error_message", error_message)
         elif status != "error":
             set_state("error_message", None)
     else:
-        logging.error(f"Failed to update processing state to: {status}")
+        logging.error("Failed to update processing state to: %s", status)
 
 
 def is_file_being_processed(filename: str) -> bool:
@@ -206,8 +220,9 @@ def is_file_being_processed(filename: str) -> bool:
     Returns:
         True if the file is being processed
     """
-    return (get_state("current_file_name") == filename and 
-            get_state("processing_status") == "processing")
+    session_state = st.session_state
+    return (session_state.get("current_file_name") == filename and 
+            session_state.get("processing_status") == "processing")
 
 
 def is_file_complete(filename: str) -> bool:
@@ -220,9 +235,11 @@ def is_file_complete(filename: str) -> bool:
     Returns:
         True if the file processing is complete
     """
-    return (get_state("current_file_name") == filename and 
-            get_state("processing_status") == "complete" and
-            get_state("transcript_text") is not None)
+    session_state = st.session_state
+    # Status first: it rules out most files with one cheap comparison
+    return (session_state.get("processing_status") == "complete" and
+            session_state.get("current_file_name") == filename and 
+            session_state.get("transcript_text") is not None)
 
 
 def clear_transcript_data() -> None:
@@ -231,5 +248,6 @@ def clear_transcript_data() -> None:
         "transcript_text": None,
         "edited_transcript": None,
         "transcript_editor_content": "",
+        "transcript_editor_seed": None,
         "current_file_name": None
     })
@@ -1,8 +1,11 @@
+import re
+from functools import lru_cache
+from itertools import islice
+
 import streamlit as st
 
-def apply_custom_styles():
-    """Applies custom CSS styles to the Streamlit app."""
-    custom_css = """
+# Built once at import; apply_custom_styles re-sends it on every rerun
+_CUSTOM_CSS = """
     <style>
         @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
 
@@ -24,6 +27,10 @@ def apply_custom_styles():
             margin-bottom: 15px !important;
             font-size: 1.25rem;
         }
+        .centered-title { /* Login screen headings */
+            text-align: center;
+            margin-bottom: 20px;
+        }
 
         /* General Layout & Containers */
         .main .block-container {
@@ -154,19 +161,56 @@ def apply_custom_styles():
         footer {display: none;}
     </style>
     """
-    st.markdown(custom_css, unsafe_allow_html=True)
 
+def apply_custom_styles():
+    """Applies custom CSS styles to the Streamlit app."""
+    st.markdown(_CUSTOM_CSS, unsafe_allow_html=True)
+
+# Markers of a non-speech event anywhere in a line
+_SPECIAL_EVENT_RE = re.compile(r'\[(?:MUSIC|JINGLE)\]|Sound')
+
+# A transcript line with at least one non-whitespace character
+_LINE_RE = re.compile(r'^[^\S\n]*\S.*$', re.MULTILINE)
+
+@lru_cache(maxsize=4096)
 def format_transcript_line(line):
-    """Format a transcript line with styled timestamps and speakers"""
-    if '[' in line and ']' in line:
-        timestamp = line[line.find('['): line.find(']') + 1]
-        remaining = line[line.find(']') + 1:].strip()
+    """Format a transcript line with styled timestamps and speakers.
+    
+    Memoized per line, so re-rendering an edited transcript only formats
+    the lines that changed.
+    """
+    # The first "[...]" token is the timestamp
+    rest = line.partition('[')[2]
+    timestamp_body, close_bracket, remaining = rest.partition(']')
+    if close_bracket:
+        timestamp = f'[{timestamp_body}]'
+        remaining = remaining.strip()
         
-        if '[MUSIC]' in line or '[JINGLE]' in line or 'Sound' in line:
+        if _SPECIAL_EVENT_RE.search(line):
             return f'<span class="timestamp">{timestamp}</span> <span class="special-event">{remaining}</span>'
         
-        if ':' in remaining:
-            speaker, text = remaining.split(':', 1)
+        speaker, sep, text = remaining.partition(':')
+        if sep:
             return f'<span class="timestamp">{timestamp}</span> <span class="speaker">{speaker}</span>:{text}'
         
     return line
+
+
+def format_transcript_block(text, max_lines=None):
+    """
+    Format a whole transcript as styled <p> paragraphs.
+    
+    Lines are found with a single regex scan over the text instead of
+    splitting it into a list first; blank lines are dropped.
+    
+    Args:
+        text: Transcript text
+        max_lines: Optional cap on the number of lines formatted
+        
+    Returns:
+        Tuple of (HTML for at most max_lines lines, total number of non-blank lines)
+    """
+    matches = _LINE_RE.finditer(text)
+    formatted_lines = [format_transcript_line(m.group(0)) for m in islice(matches, max_lines)]
+    total_lines = len(formatted_lines) + sum(1 for _ in matches)
+    return '<p>' + '</p><p>'.join(formatted_lines) + '</p>', total_lines
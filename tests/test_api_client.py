@@ -1,31 +1,43 @@
 import pytest
+import importlib
+import sys
 from unittest.mock import patch, MagicMock
-import os
+from types import SimpleNamespace
 from jinja2 import Template
 
 # Assuming config.py and api_client.py are in the parent directory or accessible in PYTHONPATH
 from config import GEMINI_MODELS, DEFAULT_MODEL
-from api_client import initialize_gemini, get_transcription_prompt, process_audio_chunk
+from api_client import (
+    initialize_gemini,
+    get_gemini_client,
+    get_transcription_prompt,
+    render_transcription_prompt,
+    extract_response_text,
+    process_audio_chunk
+)
+
+DEFAULT_MODEL_ID = GEMINI_MODELS[DEFAULT_MODEL]
+FIRST_MODEL_ID = next(iter(GEMINI_MODELS.values()))
 
 @pytest.fixture
 def mock_st_secrets(mocker):
-    """Fixture to mock streamlit.secrets."""
-    mock_secrets = MagicMock()
+    """Fixture to replace streamlit.secrets with a plain dict."""
+    mock_secrets = {}
     mocker.patch('api_client.st.secrets', mock_secrets, create=True) # Use create=True if st.secrets might not exist
     return mock_secrets
 
 @pytest.fixture
-def mock_os_environ(mocker):
-    """Fixture to mock os.environ."""
-    mock_environ = {}
-    mocker.patch.dict(os.environ, mock_environ, clear=True)
-    return mock_environ
+def mock_os_environ(monkeypatch):
+    """Fixture to unset the API key variables; returns monkeypatch to set them."""
+    monkeypatch.delenv("GOOGLE_API_KEY", raising=False)
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    return monkeypatch
 
 @pytest.fixture
 def mock_genai_client(mocker):
     """Fixture to mock google.generativeai configuration and models."""
     # Mock the configure function
-    mocker.patch('api_client.genai.configure')
+    mocker.patch('google.generativeai.configure')
     
     # Mock the GeminiClient class that we create
     mock_client_instance = MagicMock()
@@ -36,77 +48,35 @@ def mock_genai_client(mocker):
     return mock_client_instance, None
 
 # Tests for initialize_gemini
-def test_initialize_gemini_st_secrets_google_api_key(mock_st_secrets, mock_genai_client, mock_os_environ, mocker):
-    mock_st_secrets.GOOGLE_API_KEY = "streamlit_google_key"
-    mock_configure = mocker.patch('api_client.genai.configure')
+@pytest.mark.parametrize("source, key_name, api_key", [
+    ("secrets", "GOOGLE_API_KEY", "streamlit_google_key"),
+    ("secrets", "GEMINI_API_KEY", "streamlit_gemini_key"),
+    ("environ", "GOOGLE_API_KEY", "env_google_key"),
+    ("environ", "GEMINI_API_KEY", "env_gemini_key"),
+])
+def test_initialize_gemini_api_key_sources(source, key_name, api_key, mock_st_secrets, mock_os_environ, mocker):
+    if source == "secrets":
+        mock_st_secrets[key_name] = api_key
+    else:
+        mock_os_environ.setenv(key_name, api_key)
+    mock_configure = mocker.patch('google.generativeai.configure')
     
     client, error, model_id = initialize_gemini()
     assert client is not None
     assert error is None
-    assert model_id == GEMINI_MODELS[DEFAULT_MODEL]
-    mock_configure.assert_called_once_with(api_key="streamlit_google_key")
-
-def test_initialize_gemini_st_secrets_gemini_api_key(mock_st_secrets, mock_genai_client, mock_os_environ, mocker):
-    # Make GOOGLE_API_KEY unavailable in st.secrets
-    mock_st_secrets.get = lambda key, default=None: None
-    mock_st_secrets.secrets = {"GEMINI_API_KEY": "streamlit_gemini_key"}
-    if hasattr(mock_st_secrets, 'GOOGLE_API_KEY'):
-        del mock_st_secrets.GOOGLE_API_KEY
-    
-    mock_configure = mocker.patch('api_client.genai.configure')
-    
-    client, error, model_id = initialize_gemini()
-    assert client is not None
-    assert error is None
-    assert model_id == GEMINI_MODELS[DEFAULT_MODEL]
-    mock_configure.assert_called_once_with(api_key="streamlit_gemini_key")
-
-
-def test_initialize_gemini_os_environ_google_api_key(mock_os_environ, mock_genai_client, mock_st_secrets, mocker):
-    mock_os_environ["GOOGLE_API_KEY"] = "env_google_key"
-    mock_st_secrets.get = lambda key, default=None: None
-    if hasattr(mock_st_secrets, 'GOOGLE_API_KEY'): del mock_st_secrets.GOOGLE_API_KEY
-    if hasattr(mock_st_secrets, 'secrets'): del mock_st_secrets.secrets
-    
-    mock_configure = mocker.patch('api_client.genai.configure')
-    
-    client, error, model_id = initialize_gemini()
-    assert client is not None
-    assert error is None
-    assert model_id == GEMINI_MODELS[DEFAULT_MODEL]
-    mock_configure.assert_called_once_with(api_key="env_google_key")
-
-def test_initialize_gemini_os_environ_gemini_api_key(mock_os_environ, mock_genai_client, mock_st_secrets, mocker):
-    mock_os_environ["GEMINI_API_KEY"] = "env_gemini_key"
-    mock_st_secrets.get = lambda key, default=None: None
-    if hasattr(mock_st_secrets, 'GOOGLE_API_KEY'): del mock_st_secrets.GOOGLE_API_KEY
-    if hasattr(mock_st_secrets, 'secrets'): del mock_st_secrets.secrets
-    if "GOOGLE_API_KEY" in mock_os_environ: del mock_os_environ["GOOGLE_API_KEY"]
-    
-    mock_configure = mocker.patch('api_client.genai.configure')
-    
-    client, error, model_id = initialize_gemini()
-    assert client is not None
-    assert error is None
-    assert model_id == GEMINI_MODELS[DEFAULT_MODEL]
-    mock_configure.assert_called_once_with(api_key="env_gemini_key")
+    assert model_id == DEFAULT_MODEL_ID
+    mock_configure.assert_called_once_with(api_key=api_key)
 
 def test_initialize_gemini_no_api_key(mock_os_environ, mock_st_secrets, mock_genai_client):
-    # Ensure no keys are found anywhere
-    mock_st_secrets.get = lambda key, default=None: None
-    if hasattr(mock_st_secrets, 'GOOGLE_API_KEY'): del mock_st_secrets.GOOGLE_API_KEY
-    if hasattr(mock_st_secrets, 'secrets'): del mock_st_secrets.secrets
-    if "GOOGLE_API_KEY" in mock_os_environ: del mock_os_environ["GOOGLE_API_KEY"]
-    if "GEMINI_API_KEY" in mock_os_environ: del mock_os_environ["GEMINI_API_KEY"]
-
+    # Both fixtures start empty, so no key is found anywhere
     client, error, model_id = initialize_gemini()
     assert client is None
     assert "API key not found" in error
     assert model_id is None
 
 def test_initialize_gemini_client_init_exception(mock_st_secrets, mock_genai_client, mock_os_environ, mocker):
-    mock_st_secrets.GOOGLE_API_KEY = "some_key"
-    mock_configure = mocker.patch('api_client.genai.configure', side_effect=Exception("GenAI client failed"))
+    mock_st_secrets["GOOGLE_API_KEY"] = "some_key"
+    mock_configure = mocker.patch('google.generativeai.configure', side_effect=Exception("GenAI client failed"))
     
     client, error, model_id = initialize_gemini()
     assert client is None
@@ -114,9 +84,9 @@ def test_initialize_gemini_client_init_exception(mock_st_secrets, mock_genai_cli
     assert model_id is None
 
 def test_initialize_gemini_invalid_model_name(mock_st_secrets, mock_genai_client, mock_os_environ, mocker):
-    mock_st_secrets.GOOGLE_API_KEY = "some_key"
+    mock_st_secrets["GOOGLE_API_KEY"] = "some_key"
     mock_warning = mocker.patch('api_client.st.warning')
-    mock_configure = mocker.patch('api_client.genai.configure')
+    mock_configure = mocker.patch('google.generativeai.configure')
     
     # Test with a model name not in GEMINI_MODELS (values)
     invalid_model_name = "gemini-invalid-model"
@@ -125,50 +95,91 @@ def test_initialize_gemini_invalid_model_name(mock_st_secrets, mock_genai_client
     assert client is not None
     assert error is None
     # Should fall back to the default model ID
-    assert model_id == GEMINI_MODELS[DEFAULT_MODEL]
+    assert model_id == DEFAULT_MODEL_ID
     mock_configure.assert_called_once_with(api_key="some_key")
     mock_warning.assert_called_once()
 
 def test_initialize_gemini_specific_valid_model_name(mock_st_secrets, mock_genai_client, mock_os_environ, mocker):
-    mock_st_secrets.GOOGLE_API_KEY = "some_key"
-    mock_configure = mocker.patch('api_client.genai.configure')
+    mock_st_secrets["GOOGLE_API_KEY"] = "some_key"
+    mock_configure = mocker.patch('google.generativeai.configure')
     
     # Pick a specific model from config
-    specific_model_key = list(GEMINI_MODELS.keys())[0]
-    specific_model_id = GEMINI_MODELS[specific_model_key]
-    
-    client, error, model_id = initialize_gemini(model_name=specific_model_id)
+    client, error, model_id = initialize_gemini(model_name=FIRST_MODEL_ID)
     assert client is not None
     assert error is None
-    assert model_id == specific_model_id
+    assert model_id == FIRST_MODEL_ID
     mock_configure.assert_called_once_with(api_key="some_key")
 
+def test_api_client_imports_without_gemini_sdk(monkeypatch, mock_st_secrets, mock_os_environ):
+    # The SDK is only imported once a client is built
+    monkeypatch.setitem(sys.modules, 'google.generativeai', None)
+    monkeypatch.delitem(sys.modules, 'api_client')
+    api_client = importlib.import_module('api_client')
+    
+    mock_os_environ.setenv("GOOGLE_API_KEY", "env_google_key")
+    client, error, _ = api_client.initialize_gemini()
+    assert client is None
+    assert error.startswith("Failed to initialize Gemini client")
+
+def test_get_gemini_client_caches_success_only(mocker):
+    from api_client import _cached_gemini_client
+    _cached_gemini_client.clear()
+    mock_init = mocker.patch('api_client.initialize_gemini', side_effect=[
+        (None, "API key not found.", None),
+        (MagicMock(), None, "gemini-1.5-flash"),
+    ])
+
+    client, error, model_id = get_gemini_client("gemini-1.5-flash")
+    assert client is None
+    assert error == "API key not found."
+
+    # A failed initialization is retried; a successful one is reused
+    client, error, model_id = get_gemini_client("gemini-1.5-flash")
+    again, _, _ = get_gemini_client("gemini-1.5-flash")
+    assert client is not None and again is client
+    assert error is None
+    assert model_id == "gemini-1.5-flash"
+    assert mock_init.call_count == 2
+    _cached_gemini_client.clear()
+
 # Tests for get_transcription_prompt
+@pytest.fixture(scope="session")
+def prompt_template():
+    """The compiled prompt template, shared by the render tests."""
+    return get_transcription_prompt()
+
 def test_get_transcription_prompt_returns_template():
     prompt = get_transcription_prompt()
     assert isinstance(prompt, Template)
 
-def test_get_transcription_prompt_renders_with_metadata():
-    metadata = {
-        "content_type": "podcast",
-        "description": "Weekly tech news",
-        "topic": "AI developments",
-        "language": "English"
-    }
-    num_speakers = 2
-    prompt_template = get_transcription_prompt(metadata=metadata)
-    rendered_prompt = prompt_template.render(num_speakers=num_speakers, metadata=metadata)
-
-    assert "podcast" in rendered_prompt
-    assert "Weekly tech news" in rendered_prompt
-    assert "AI developments" in rendered_prompt
-    assert "Language: English" in rendered_prompt
-    assert f"Number of distinct speakers: {num_speakers}" in rendered_prompt
-    assert "Speaker 1:" in rendered_prompt # Example format
-
-def test_get_transcription_prompt_renders_without_optional_metadata():
+def test_get_transcription_prompt_compiles_once():
+    assert get_transcription_prompt({"topic": "A"}) is get_transcription_prompt({"topic": "B"})
+
+PROMPT_METADATA = {
+    "content_type": "podcast",
+    "description": "Weekly tech news",
+    "topic": "AI developments",
+    "language": "English"
+}
+
+@pytest.fixture(scope="session")
+def rendered_prompt_with_meta(prompt_template):
+    """The prompt rendered once for PROMPT_METADATA and two speakers."""
+    return prompt_template.render(num_speakers=2, metadata=PROMPT_METADATA)
+
+@pytest.mark.parametrize("needle", [
+    "podcast",
+    "Weekly tech news",
+    "AI developments",
+    "Language: English",
+    "Number of distinct speakers: 2",
+    "Speaker 1:", # Example format
+])
+def test_get_transcription_prompt_renders_with_metadata(rendered_prompt_with_meta, needle):
+    assert needle in rendered_prompt_with_meta
+
+def test_get_transcription_prompt_renders_without_optional_metadata(prompt_template):
     num_speakers = 1
-    prompt_template = get_transcription_prompt(metadata=None) # No metadata
     rendered_prompt = prompt_template.render(num_speakers=num_speakers, metadata=None)
 
     assert "Description:" not in rendered_prompt
@@ -177,7 +188,33 @@ def test_get_transcription_prompt_renders_without_optional_metadata():
     assert "content_type: audio file" # Default content type
     assert f"Number of distinct speakers: {num_speakers}" in rendered_prompt
 
+def test_render_transcription_prompt_matches_template():
+    metadata = {"topic": "AI developments", "language": "English"}
+    expected = get_transcription_prompt(metadata).render(num_speakers=2, metadata=metadata)
+
+    assert render_transcription_prompt(metadata, 2) == expected
+    # Key order must not matter for the cached render
+    assert render_transcription_prompt({"language": "English", "topic": "AI developments"}, 2) == expected
+    assert render_transcription_prompt(None, 1) == get_transcription_prompt().render(num_speakers=1, metadata={})
+
+def test_extract_response_text_prefers_text_attribute():
+    response = MagicMock(text="Top-level text")
+    assert extract_response_text(response) == "Top-level text"
+
+def test_extract_response_text_falls_back_to_candidates():
+    response = MagicMock(text=None)
+    response.candidates[0].content.parts[0].text = "Candidate text"
+    assert extract_response_text(response) == "Candidate text"
+
 # Tests for process_audio_chunk (mocking API calls heavily)
+# A plain namespace has no .text attribute, so the transcript is read from
+# the first candidate part. Tests needing another response set their own.
+RESPONSE_OK = SimpleNamespace(candidates=[
+    SimpleNamespace(content=SimpleNamespace(parts=[
+        SimpleNamespace(text="This is a dummy transcript from candidate.")
+    ]))
+])
+
 @pytest.fixture
 def mock_gemini_process_flow(mock_genai_client):
     client_instance, _ = mock_genai_client
@@ -186,21 +223,10 @@ def mock_gemini_process_flow(mock_genai_client):
     mock_uploaded_file = MagicMock()
     client_instance.files.upload.return_value = mock_uploaded_file
     
-    # Mock content generation
-    mock_response = MagicMock()
-    # Simulate the structure of the response object based on usage in process_audio_chunk
-    # Option 1: response has .text attribute
-    # mock_response.text = "This is a dummy transcript."
-    # Option 2: response has .candidates
-    mock_candidate = MagicMock()
-    mock_part = MagicMock()
-    mock_part.text = "This is a dummy transcript from candidate."
-    mock_candidate.content.parts = [mock_part]
-    mock_response.candidates = [mock_candidate]
-
-    client_instance.models.generate_content.return_value = mock_response
+    # Mock content generation with the shared, never mutated response
+    client_instance.models.generate_content.return_value = RESPONSE_OK
     
-    return client_instance, mock_uploaded_file, mock_response
+    return client_instance, mock_uploaded_file, RESPONSE_OK
 
 def test_process_audio_chunk_success(mock_gemini_process_flow):
     client, _, _ = mock_gemini_process_flow
@@ -217,15 +243,6 @@ def test_process_audio_chunk_success(mock_gemini_process_flow):
     client.files.upload.assert_called_once_with(file=chunk_path, config={"mimeType": mime_type})
     client.models.generate_content.assert_called_once() # Basic check, can be more specific
 
-def test_process_audio_chunk_upload_failure(mock_gemini_process_flow):
-    client, _, _ = mock_gemini_process_flow
-    client.files.upload.side_effect = Exception("Upload failed")
-
-    transcript, error = process_audio_chunk(client, "m", "/p", "pr", "mi", 0)
-    assert transcript is None
-    assert "Upload failed" in error or "Chunk upload failed" in error # Depending on error handling in main code
-    client.models.generate_content.assert_not_called()
-
 def test_process_audio_chunk_transcription_failure(mock_gemini_process_flow):
     client, _, _ = mock_gemini_process_flow
     client.models.generate_content.side_effect = Exception("Transcription API error")
@@ -236,27 +253,24 @@ def test_process_audio_chunk_transcription_failure(mock_gemini_process_flow):
     client.files.upload.assert_called_once() # Upload should still be called
 
 def test_process_audio_chunk_text_extraction_failure(mock_gemini_process_flow):
-    client, _, mock_response = mock_gemini_process_flow
-    # Make the response object such that text extraction fails (e.g., no .text and no .candidates)
-    if hasattr(mock_response, 'text'): del mock_response.text
-    if hasattr(mock_response, 'candidates'): del mock_response.candidates
-    # Or, make candidates an empty list, or parts an empty list, etc.
-    # mock_response.candidates = [] 
+    client, _, _ = mock_gemini_process_flow
+    # A response with neither .text nor .candidates, so text extraction fails
+    client.models.generate_content.return_value = SimpleNamespace()
 
     transcript, error = process_audio_chunk(client, "m", "/p", "pr", "mi", 0)
     assert transcript is None
     assert "Could not extract transcript text" in error
 
-def test_process_audio_chunk_upload_auth_error(mock_gemini_process_flow):
+@pytest.mark.parametrize("exc_msg, expected", [
+    ("Upload failed", "Chunk upload failed: Upload failed"),
+    ("unauthorized access", "API authentication error"),
+    ("quota exceeded", "API quota exceeded"),
+])
+def test_process_audio_chunk_upload_errors(mock_gemini_process_flow, exc_msg, expected):
     client, _, _ = mock_gemini_process_flow
-    client.files.upload.side_effect = Exception("unauthorized access")
-    transcript, error = process_audio_chunk(client, "m", "/p", "pr", "mi", 0)
-    assert transcript is None
-    assert "API authentication error" in error
+    client.files.upload.side_effect = Exception(exc_msg)
 
-def test_process_audio_chunk_upload_quota_error(mock_gemini_process_flow):
-    client, _, _ = mock_gemini_process_flow
-    client.files.upload.side_effect = Exception("quota exceeded")
     transcript, error = process_audio_chunk(client, "m", "/p", "pr", "mi", 0)
     assert transcript is None
-    assert "API quota exceeded" in error
+    assert expected in error
+    client.models.generate_content.assert_not_called()
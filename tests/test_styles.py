@@ -0,0 +1,33 @@
+import pytest
+
+from styles import format_transcript_block, format_transcript_line
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("[00:00:05] Speaker 1: Hello world.",
+     '<span class="timestamp">[00:00:05]</span> <span class="speaker">Speaker 1</span>: Hello world.'),
+    ("[01:02] [MUSIC]",
+     '<span class="timestamp">[01:02]</span> <span class="special-event">[MUSIC]</span>'),
+    ("[01:02] [JINGLE]",
+     '<span class="timestamp">[01:02]</span> <span class="special-event">[JINGLE]</span>'),
+    ("[MUSIC] fades out",
+     '<span class="timestamp">[MUSIC]</span> <span class="special-event">fades out</span>'),
+    ("[00:10] Sound of rain",
+     '<span class="timestamp">[00:10]</span> <span class="special-event">Sound of rain</span>'),
+    ("[00:10] No speaker here", "[00:10] No speaker here"), # No colon, left as is
+    ("Speaker 1: No timestamp", "Speaker 1: No timestamp"),
+    ("", ""),
+])
+def test_format_transcript_line(line, expected):
+    assert format_transcript_line(line) == expected
+
+
+def test_format_transcript_block_skips_blank_lines_and_caps_output():
+    text = "[00:01] Speaker 1: Hi\n\n   \n[00:02] Speaker 2: Hello\nplain"
+    html, total = format_transcript_block(text, max_lines=2)
+    assert total == 3
+    assert html == (
+        '<p><span class="timestamp">[00:01]</span> <span class="speaker">Speaker 1</span>: Hi</p>'
+        '<p><span class="timestamp">[00:02]</span> <span class="speaker">Speaker 2</span>: Hello</p>'
+    )
+    assert format_transcript_block("") == ('<p></p>', 0)
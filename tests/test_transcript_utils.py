@@ -1,10 +1,12 @@
 import pytest
 import json
+import re
 from transcript_utils import (
     adjust_chunk_timestamps,
     combine_transcriptions,
     convert_timestamp_to_srt,
-    format_transcript_for_export
+    format_transcript_for_export,
+    _parse_transcript_lines
 )
 from config import CHUNK_DURATION_MS # Assuming default CHUNK_DURATION_MS is 120000 (2 minutes)
 
@@ -59,6 +61,20 @@ def test_adjust_chunk_timestamps_hhmmss_format():
     adjusted = adjust_chunk_timestamps(TRANSCRIPT_CHUNK_HHMMSS, 1, chunk_duration_ms=CHUNK_DURATION_MS)
     assert adjusted.split('\n') == EXPECTED_CHUNK_1_HHMMSS_ADJUSTED.split('\n')
 
+def test_adjust_chunk_timestamps_chunk_0_keeps_timestamps():
+    text = "[00:10] Speaker 1: Hi\n\n  \n[01:02:03] Speaker 2: Hello\n[END]"
+    assert adjust_chunk_timestamps(text, 0) == "[00:10] Speaker 1: Hi\n[01:02:03] Speaker 2: Hello"
+
+def test_adjust_chunk_timestamps_chunk_0_normalizes_like_later_chunks():
+    text = "[1:05] Speaker 1: Hi\n[0:3] Speaker 2: Hello\n[00:07] Speaker 1: Bye"
+    timestamp_re = re.compile(r'\[\d\d:\d\d\] ')
+    for chunk_index in (0, 1):
+        lines = adjust_chunk_timestamps(text, chunk_index, chunk_duration_ms=120000).split('\n')
+        assert all(timestamp_re.match(line) for line in lines)
+    assert adjust_chunk_timestamps(text, 0, chunk_duration_ms=120000) == (
+        "[01:05] Speaker 1: Hi\n[00:03] Speaker 2: Hello\n[00:07] Speaker 1: Bye"
+    )
+
 def test_adjust_chunk_timestamps_empty_input():
     assert adjust_chunk_timestamps("", 0) == ""
     assert adjust_chunk_timestamps("", 1) == ""
@@ -124,9 +140,11 @@ def test_combine_transcriptions_chunks_without_end_marker():
     ("[59:59]", "00:59:59,000"),
     ("[01:00:00]", "01:00:00,000"), # HH:MM:SS
     ("[10:20:30]", "10:20:30,000"),
+    ("[25:00:00]", "25:00:00,000"), # Past 24 hours
     ("invalid", "00:00:00,000"), # Invalid format
     ("[]", "00:00:00,000"), # Empty brackets
     ("[00:00:00:00]", "00:00:00,000"), # Too many parts
+    ("[:]", "00:00:00,000"), # Missing numbers
 ])
 def test_convert_timestamp_to_srt(input_ts, expected_srt_ts):
     assert convert_timestamp_to_srt(input_ts) == expected_srt_ts
@@ -236,3 +254,27 @@ def test_format_transcript_for_export_json_timestamp_parsing_edge_cases():
     } # Line with bad timestamp is skipped
     formatted = format_transcript_for_export(transcript, 'json')
     assert json.loads(formatted) == expected_json
+
+def test_format_transcript_for_export_parses_once_across_formats():
+    transcript = "[00:01] Speaker A: Shared parse\n[END]\n[00:03] [MUSIC]"
+    _parse_transcript_lines.cache_clear()
+    format_transcript_for_export(transcript, 'srt')
+    format_transcript_for_export(transcript, 'json')
+    info = _parse_transcript_lines.cache_info()
+    assert (info.misses, info.hits) == (1, 1)
+    assert _parse_transcript_lines(transcript) == (("00:01", "00:03"), ("Speaker A: Shared parse", "[MUSIC]"))
+
+def test_format_transcript_for_export_srt_past_24_hours():
+    # SRT hours keep counting instead of rolling over into days
+    formatted = format_transcript_for_export("[25:00:00] Speaker 1: Late", 'srt')
+    assert formatted.split('\n')[1] == "25:00:00,000 --> 25:00:03,000"
+
+def test_format_transcript_for_export_json_without_orjson(monkeypatch):
+    transcript = "[00:01] Speaker A: Café\n[00:02] [MUSIC]"
+    with_orjson = format_transcript_for_export(transcript, 'json')
+    monkeypatch.setattr("transcript_utils.orjson", None)
+    without_orjson = format_transcript_for_export(transcript, 'json')
+    assert json.loads(with_orjson) == json.loads(without_orjson)
+    # Indented by two spaces, like orjson's OPT_INDENT_2
+    assert without_orjson == json.dumps(json.loads(without_orjson), indent=2)
+    assert format_transcript_for_export("", 'json') == json.dumps({"transcript": []}, indent=2)
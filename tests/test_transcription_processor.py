@@ -1,274 +1,352 @@
 import pytest
-from unittest.mock import patch, MagicMock, call, ANY
-import os
+import io
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+from unittest.mock import ANY, MagicMock, call
 
-from transcription_processor import TranscriptionProcessor
-from config import CHUNK_DURATION_MS, MIN_CHUNK_SUCCESS_PERCENTAGE, MAX_FILE_SIZE_MB_FOR_SIMPLE_UPLOAD
-# Assuming api_client.process_audio_chunk might be needed if not mocking _process_single_chunk directly
-# from api_client import process_audio_chunk # For now, we'll mock _process_single_chunk
+from config import CHUNK_DURATION_MS, CHUNK_THRESHOLD_MB
+import transcription_processor
+from transcription_processor import TranscriptionProcessor, process_transcription_task
+
+MOCK_FILE_PATH = "dummy/audio.mp3"
+MOCK_FILE_FORMAT = "mp3"
+MOCK_PROMPT = "Transcribe this audio"
+MOCK_METADATA = {"language": "English"}
+MOCK_NUM_SPEAKERS = 1
+SMALL_FILE_SIZE_MB = CHUNK_THRESHOLD_MB - 1
+LARGE_FILE_SIZE_MB = CHUNK_THRESHOLD_MB + 1
 
 @pytest.fixture
 def mock_gemini_client():
+    """Client whose uploads are named after their content and transcribed back."""
     client = MagicMock()
-    # Default success for upload and generate_content for simpler test cases
-    client.files.upload.return_value = MagicMock(name="UploadedFile")
-    mock_response = MagicMock()
-    mock_response.text = "Default transcript part"
-    mock_response.candidates = [MagicMock(content=MagicMock(parts=[MagicMock(text="Default transcript candidate")]))]
-    client.models.generate_content.return_value = mock_response
+
+    def upload(file, config):
+        if isinstance(file, str):
+            return SimpleNamespace(name=f"files/{file}")
+        return SimpleNamespace(name=f"files/{file.read().decode()}")
+
+    client.files.upload.side_effect = upload
+    client.models.generate_content.side_effect = lambda model, contents: SimpleNamespace(
+        text=f"[00:05] Speaker 1: {contents[1].name}"
+    )
     return client
 
 @pytest.fixture
 def processor(mock_gemini_client):
-    # Ensure the processor is initialized with a model name that exists in GEMINI_MODELS or is a direct model_id
-    # For testing, we can assume "gemini-test-model" is a valid model_id string.
-    return TranscriptionProcessor(client=mock_gemini_client, model_name="gemini-pro", prompt_template=MagicMock())
+    return TranscriptionProcessor(client=mock_gemini_client, model_name="gemini-test-model")
 
-# Mock data for calls
-MOCK_FILE_PATH = "dummy/audio.mp3"
-MOCK_FILE_FORMAT = "mp3"
-MOCK_METADATA = {"language": "en"}
-MOCK_NUM_SPEAKERS = 1
-SMALL_FILE_SIZE_MB = MAX_FILE_SIZE_MB_FOR_SIMPLE_UPLOAD - 1  # Small enough for simple upload
-LARGE_FILE_SIZE_MB = MAX_FILE_SIZE_MB_FOR_SIMPLE_UPLOAD + 1  # Large enough for chunking
+def make_chunks(*audible):
+    """Yield chunks like iter_audio_chunks; False entries are silent (None)."""
+    for i, is_audible in enumerate(audible):
+        yield i, len(audible), io.BytesIO(f"chunk{i}".encode()) if is_audible else None
 
 # --- Tests for _process_small_file (via process_audio) ---
 
 def test_process_audio_small_file_success(processor, mock_gemini_client):
-    mock_gemini_client.files.upload.return_value = MagicMock(name="TestFile")
-    mock_response = MagicMock()
-    mock_response.text = "Successful small file transcript"
-    mock_gemini_client.models.generate_content.return_value = mock_response
-
     transcript, error = processor.process_audio(
-        MOCK_FILE_PATH, SMALL_FILE_SIZE_MB, MOCK_FILE_FORMAT, MOCK_METADATA, MOCK_NUM_SPEAKERS
+        MOCK_FILE_PATH, MOCK_FILE_FORMAT, SMALL_FILE_SIZE_MB, MOCK_METADATA, MOCK_NUM_SPEAKERS
     )
 
-    assert transcript == "Successful small file transcript"
+    assert transcript == f"[00:05] Speaker 1: files/{MOCK_FILE_PATH}"
     assert error is None
-    mock_gemini_client.files.upload.assert_called_once_with(file=MOCK_FILE_PATH, config={"mimeType": f"audio/{MOCK_FILE_FORMAT}"})
-    mock_gemini_client.models.generate_content.assert_called_once() # Further details can be asserted if prompt is complex
+    mock_gemini_client.files.upload.assert_called_once_with(file=MOCK_FILE_PATH, config={"mimeType": "audio/mpeg"})
+    mock_gemini_client.files.delete.assert_called_once_with(name=f"files/{MOCK_FILE_PATH}")
 
 def test_process_audio_small_file_upload_failure(processor, mock_gemini_client):
     mock_gemini_client.files.upload.side_effect = Exception("Upload failed")
 
     transcript, error = processor.process_audio(
-        MOCK_FILE_PATH, SMALL_FILE_SIZE_MB, MOCK_FILE_FORMAT, MOCK_METADATA, MOCK_NUM_SPEAKERS
+        MOCK_FILE_PATH, MOCK_FILE_FORMAT, SMALL_FILE_SIZE_MB, MOCK_METADATA, MOCK_NUM_SPEAKERS
     )
 
     assert transcript is None
     assert "Upload failed" in error
-    mock_gemini_client.files.upload.assert_called_once_with(file=MOCK_FILE_PATH, config={"mimeType": f"audio/{MOCK_FILE_FORMAT}"})
     mock_gemini_client.models.generate_content.assert_not_called()
 
-def test_process_audio_small_file_transcription_api_failure(processor, mock_gemini_client):
-    mock_gemini_client.files.upload.return_value = MagicMock(name="TestFile")
+def test_process_audio_small_file_api_failure_deletes_upload(processor, mock_gemini_client):
     mock_gemini_client.models.generate_content.side_effect = Exception("API error")
 
     transcript, error = processor.process_audio(
-        MOCK_FILE_PATH, SMALL_FILE_SIZE_MB, MOCK_FILE_FORMAT, MOCK_METADATA, MOCK_NUM_SPEAKERS
+        MOCK_FILE_PATH, MOCK_FILE_FORMAT, SMALL_FILE_SIZE_MB, MOCK_METADATA, MOCK_NUM_SPEAKERS
     )
 
     assert transcript is None
     assert "API error" in error
-    mock_gemini_client.files.upload.assert_called_once_with(file=MOCK_FILE_PATH, config={"mimeType": f"audio/{MOCK_FILE_FORMAT}"})
-    mock_gemini_client.models.generate_content.assert_called_once()
+    mock_gemini_client.files.delete.assert_called_once_with(name=f"files/{MOCK_FILE_PATH}")
 
-# --- Tests for _process_large_file (via process_audio) ---
+# --- Tests for _process_single_chunk ---
 
-@patch('transcription_processor.file_utils.chunk_audio_file')
-@patch('transcription_processor.TranscriptionProcessor._process_single_chunk')
-@patch('transcription_processor.transcript_utils.combine_transcriptions')
-@patch('transcription_processor.file_utils.cleanup_chunks')
-def test_process_audio_large_file_success(
-    mock_cleanup_chunks, mock_combine_transcriptions, mock_process_single_chunk, 
-    mock_chunk_audio_file, processor
-):
-    mock_chunk_paths = ["chunk1.mp3", "chunk2.mp3"]
-    mock_chunk_audio_file.return_value = (mock_chunk_paths, 2) # (paths, num_chunks)
-    # _process_single_chunk should return (text, None) for success
-    mock_process_single_chunk.side_effect = [
-        ("Transcript chunk 1.", None), 
-        ("Transcript chunk 2.", None)
-    ]
-    mock_combine_transcriptions.return_value = "Combined transcript from chunks."
+def test_process_single_chunk_success(processor, mock_gemini_client):
+    chunk = io.BytesIO(b"chunk1")
 
-    transcript, error = processor.process_audio(
-        MOCK_FILE_PATH, LARGE_FILE_SIZE_MB, MOCK_FILE_FORMAT, MOCK_METADATA, MOCK_NUM_SPEAKERS
-    )
+    transcript = processor._process_single_chunk(1, chunk, MOCK_PROMPT, "audio/mpeg", 2)
 
-    assert transcript == "Combined transcript from chunks."
-    assert error is None
-    mock_chunk_audio_file.assert_called_once_with(MOCK_FILE_PATH, MOCK_FILE_FORMAT, CHUNK_DURATION_MS)
-    assert mock_process_single_chunk.call_count == 2
-    mock_process_single_chunk.assert_any_call(mock_chunk_paths[0], 0, MOCK_FILE_FORMAT, MOCK_METADATA, MOCK_NUM_SPEAKERS)
-    mock_process_single_chunk.assert_any_call(mock_chunk_paths[1], 1, MOCK_FILE_FORMAT, MOCK_METADATA, MOCK_NUM_SPEAKERS)
-    mock_combine_transcriptions.assert_called_once_with(["Transcript chunk 1.", "Transcript chunk 2."])
-    mock_cleanup_chunks.assert_called_once_with(mock_chunk_paths)
+    # Timestamps are shifted by the chunk's offset in the full recording
+    assert transcript == "[02:05] Speaker 1: files/chunk1"
+    assert chunk.closed
+    mock_gemini_client.files.delete.assert_called_once_with(name="files/chunk1")
 
-@patch('transcription_processor.file_utils.chunk_audio_file')
-def test_process_audio_large_file_chunking_failure(mock_chunk_audio_file, processor):
-    mock_chunk_audio_file.return_value = ([], 0) # Simulate chunking failure
+def test_process_single_chunk_api_failure_deletes_upload(processor, mock_gemini_client):
+    mock_gemini_client.models.generate_content.side_effect = Exception("API error")
 
-    transcript, error = processor.process_audio(
-        MOCK_FILE_PATH, LARGE_FILE_SIZE_MB, MOCK_FILE_FORMAT, MOCK_METADATA, MOCK_NUM_SPEAKERS
+    assert processor._process_single_chunk(0, io.BytesIO(b"chunk0"), MOCK_PROMPT, "audio/mpeg", 1) is None
+    mock_gemini_client.files.delete.assert_called_once_with(name="files/chunk0")
+
+def test_process_single_chunk_upload_failure(processor, mock_gemini_client):
+    mock_gemini_client.files.upload.side_effect = Exception("quota exceeded")
+    chunk = io.BytesIO(b"chunk0")
+
+    assert processor._process_single_chunk(0, chunk, MOCK_PROMPT, "audio/mpeg", 1) is None
+    assert chunk.closed
+    mock_gemini_client.models.generate_content.assert_not_called()
+
+# --- Tests for _process_chunks_parallel ---
+
+def test_process_chunks_parallel_returns_chunk_order(processor, mocker):
+    # Chunk 0 only finishes once chunk 1 has been collected
+    chunk_1_collected = threading.Event()
+
+    def process_single_chunk(index, chunk, prompt, mime_type, num_chunks):
+        if index == 0:
+            assert chunk_1_collected.wait(timeout=5)
+        return f"text {index}"
+
+    mocker.patch.object(processor, '_process_single_chunk', side_effect=process_single_chunk)
+    collected = []
+
+    def chunk_callback(index, text):
+        collected.append(index)
+        if index == 1:
+            chunk_1_collected.set()
+
+    processor.chunk_callback = chunk_callback
+    transcriptions, num_audible = processor._process_chunks_parallel(
+        make_chunks(True, True), MOCK_PROMPT, "audio/mpeg"
     )
 
-    assert transcript is None
-    assert "Failed to split audio file into chunks" in error
-    mock_chunk_audio_file.assert_called_once_with(MOCK_FILE_PATH, MOCK_FILE_FORMAT, CHUNK_DURATION_MS)
-
-@patch('transcription_processor.file_utils.chunk_audio_file')
-@patch('transcription_processor.TranscriptionProcessor._process_single_chunk')
-@patch('transcription_processor.file_utils.cleanup_chunks')
-@patch('transcription_processor.transcript_utils.combine_transcriptions') # Though not expected to be called directly
-def test_process_audio_large_file_partial_failure_fallback_success(
-    mock_combine_transcriptions, mock_cleanup_chunks, mock_process_single_chunk,
-    mock_chunk_audio_file, processor, mock_gemini_client # Need mock_gemini_client for fallback
-):
-    mock_chunk_paths = ["c1.mp3", "c2.mp3", "c3.mp3", "c4.mp3", "c5.mp3"] # 5 chunks
-    mock_chunk_audio_file.return_value = (mock_chunk_paths, 5)
-    
-    # Simulate failure for most chunks (e.g., 1 success, 4 failures)
-    # MIN_CHUNK_SUCCESS_PERCENTAGE is 0.6, so 1/5 = 0.2 is less, should trigger fallback
-    mock_process_single_chunk.side_effect = [
-        ("Successful chunk.", None),
-        (None, "Error processing chunk 2"),
-        (None, "Error processing chunk 3"),
-        (None, "Error processing chunk 4"),
-        (None, "Error processing chunk 5"),
-    ]
-
-    # Configure fallback (_process_small_file path) to succeed
-    mock_gemini_client.files.upload.return_value = MagicMock(name="FallbackUpload")
-    mock_fallback_response = MagicMock()
-    mock_fallback_response.text = "Fallback successful transcript"
-    mock_gemini_client.models.generate_content.return_value = mock_fallback_response
-    
-    # Reset call counts for client mocks for fallback verification
-    mock_gemini_client.files.upload.reset_mock()
-    mock_gemini_client.models.generate_content.reset_mock()
+    assert collected == [1, 0]
+    assert transcriptions == ["text 0", "text 1"]
+    assert num_audible == 2
 
-    transcript, error = processor.process_audio(
-        MOCK_FILE_PATH, LARGE_FILE_SIZE_MB, MOCK_FILE_FORMAT, MOCK_METADATA, MOCK_NUM_SPEAKERS
+def test_process_chunks_parallel_skips_silent_chunks(processor, mocker):
+    single_chunk = mocker.patch.object(processor, '_process_single_chunk',
+                                       side_effect=lambda index, *args: f"text {index}")
+
+    transcriptions, num_audible = processor._process_chunks_parallel(
+        make_chunks(True, False, True, False, True), MOCK_PROMPT, "audio/mpeg"
     )
 
-    assert transcript == "Fallback successful transcript"
-    assert error is None # Fallback succeeded
-    mock_chunk_audio_file.assert_called_once()
-    assert mock_process_single_chunk.call_count == 5
-    mock_cleanup_chunks.assert_called_once_with(mock_chunk_paths)
-    
-    # Verify fallback path was taken
-    mock_gemini_client.files.upload.assert_called_once_with(file=MOCK_FILE_PATH, config={"mimeType": f"audio/{MOCK_FILE_FORMAT}"})
-    mock_gemini_client.models.generate_content.assert_called_once() # Check it was called for fallback
-    mock_combine_transcriptions.assert_not_called() # Fallback doesn't combine
-
-@patch('transcription_processor.file_utils.chunk_audio_file')
-@patch('transcription_processor.TranscriptionProcessor._process_single_chunk')
-@patch('transcription_processor.file_utils.cleanup_chunks')
-def test_process_audio_large_file_complete_chunk_failure_fallback_failure(
-    mock_cleanup_chunks, mock_process_single_chunk,
-    mock_chunk_audio_file, processor, mock_gemini_client # Need mock_gemini_client for fallback
-):
-    mock_chunk_paths = ["c1.mp3", "c2.mp3"]
-    mock_chunk_audio_file.return_value = (mock_chunk_paths, 2)
-    
-    # All chunks fail
-    mock_process_single_chunk.side_effect = [
-        (None, "Error processing chunk 1"),
-        (None, "Error processing chunk 2"),
-    ]
-
-    # Configure fallback (_process_small_file path) to also fail (e.g., upload error)
-    mock_gemini_client.files.upload.side_effect = Exception("Fallback upload failed")
-    
-    # Reset call counts for client mocks
-    mock_gemini_client.files.upload.reset_mock()
-    mock_gemini_client.models.generate_content.reset_mock()
-    # Set the side_effect again after resetting
-    mock_gemini_client.files.upload.side_effect = Exception("Fallback upload failed")
+    assert sorted(c.args[0] for c in single_chunk.call_args_list) == [0, 2, 4]
+    assert transcriptions == ["text 0", "text 2", "text 4"]
+    assert num_audible == 3
+
+def test_process_chunks_parallel_callbacks(processor, mocker):
+    mocker.patch.object(processor, '_process_single_chunk',
+                        side_effect=lambda index, *args: None if index == 2 else f"text {index}")
+    processor.progress_callback = MagicMock()
+    processor.chunk_callback = MagicMock()
+
+    processor._process_chunks_parallel(make_chunks(True, False, True), MOCK_PROMPT, "audio/mpeg")
+
+    # Progress counts audible chunks, failed ones included; the total can only
+    # be exact once every chunk has been checked for silence
+    progress = processor.progress_callback.call_args_list
+    assert [c.args[0] for c in progress] == [1, 2]
+    assert progress[-1] == call(2, 2)
+    # Text is only reported for successful chunks
+    processor.chunk_callback.assert_called_once_with(0, "text 0")
+
+def test_process_chunks_parallel_reports_adjusted_chunk_text(processor):
+    processor.chunk_callback = MagicMock()
+
+    processor._process_chunks_parallel(make_chunks(True, True), MOCK_PROMPT, "audio/mpeg")
+
+    # Partial results carry timestamps relative to the whole recording
+    processor.chunk_callback.assert_has_calls([
+        call(0, "[00:05] Speaker 1: files/chunk0"),
+        call(1, "[02:05] Speaker 1: files/chunk1"),
+    ], any_order=True)
+
+def test_process_chunks_parallel_streams_results(processor, mocker, monkeypatch):
+    monkeypatch.setattr(transcription_processor, 'MAX_WORKERS', 1)
+    mocker.patch.object(processor, '_process_single_chunk',
+                        side_effect=lambda index, *args: f"text {index}")
+    chunk_0_collected = threading.Event()
+    processor.chunk_callback = lambda index, text: chunk_0_collected.set()
+
+    def slow_chunks():
+        yield 0, 2, io.BytesIO(b"chunk0")
+        # Results are collected while later chunks are still being encoded
+        assert chunk_0_collected.is_set()
+        yield 1, 2, io.BytesIO(b"chunk1")
+
+    transcriptions, _ = processor._process_chunks_parallel(slow_chunks(), MOCK_PROMPT, "audio/mpeg")
+    assert transcriptions == ["text 0", "text 1"]
+
+def test_process_chunks_parallel_bounds_chunks_in_flight(processor, mocker, monkeypatch):
+    monkeypatch.setattr(transcription_processor, 'MAX_WORKERS', 2)
+    mocker.patch.object(processor, '_process_single_chunk',
+                        side_effect=lambda index, *args: f"text {index}")
+    collected = []
+    processor.chunk_callback = lambda index, text: collected.append(index)
+    outstanding = []
+
+    def counted_chunks():
+        for i in range(6):
+            outstanding.append(i - len(collected))
+            yield i, 6, io.BytesIO(f"chunk{i}".encode())
+
+    processor._process_chunks_parallel(counted_chunks(), MOCK_PROMPT, "audio/mpeg")
+    # A chunk is only encoded once fewer than MAX_WORKERS are waiting on the API
+    assert max(outstanding) < 2
+    assert sorted(collected) == list(range(6))
 
+# --- Tests for _process_large_file (via process_audio) ---
 
-    transcript, error = processor.process_audio(
-        MOCK_FILE_PATH, LARGE_FILE_SIZE_MB, MOCK_FILE_FORMAT, MOCK_METADATA, MOCK_NUM_SPEAKERS
+@pytest.fixture
+def large_file_env(processor, mocker):
+    """Patch chunking and the full-file fallback of a large-file run."""
+    return SimpleNamespace(
+        iter_chunks=mocker.patch('transcription_processor.iter_audio_chunks'),
+        fallback=mocker.patch.object(processor, '_process_small_file',
+                                     return_value=("Full file transcript", None)),
     )
 
-    assert transcript is None
-    assert "Fallback upload failed" in error # Error from fallback
-    mock_chunk_audio_file.assert_called_once()
-    assert mock_process_single_chunk.call_count == 2
-    mock_cleanup_chunks.assert_called_once_with(mock_chunk_paths)
-    
-    # Verify fallback path was taken and failed
-    mock_gemini_client.files.upload.assert_called_once_with(file=MOCK_FILE_PATH, config={"mimeType": f"audio/{MOCK_FILE_FORMAT}"})
-    mock_gemini_client.models.generate_content.assert_not_called() # Because upload failed
-
-# --- Tests for _process_single_chunk (if directly testing) ---
-# For this task, _process_single_chunk is implicitly tested via the large file tests
-# by mocking its return value. Direct tests would look like this:
-
-@patch('transcription_processor.api_client.process_audio_chunk')
-@patch('transcription_processor.transcript_utils.adjust_chunk_timestamps')
-def test_process_single_chunk_success(mock_adjust_timestamps, mock_api_process_chunk, processor):
-    chunk_path = "test_chunk.mp3"
-    chunk_index = 0
-    start_offset_ms = 0 # For adjust_chunk_timestamps
-    
-    mock_api_process_chunk.return_value = ("Raw chunk transcript", None)
-    mock_adjust_timestamps.return_value = "Adjusted chunk transcript"
-    
-    # Note: _process_single_chunk uses self.client and self.model_name
-    # We need to ensure the processor fixture is used or a new one is created
-    
-    transcript, error = processor._process_single_chunk(
-        chunk_path, chunk_index, MOCK_FILE_FORMAT, MOCK_METADATA, MOCK_NUM_SPEAKERS
+def run_large_file(processor):
+    return processor.process_audio(
+        MOCK_FILE_PATH, MOCK_FILE_FORMAT, LARGE_FILE_SIZE_MB, MOCK_METADATA, MOCK_NUM_SPEAKERS
     )
-    
-    assert transcript == "Adjusted chunk transcript"
+
+def test_process_audio_large_file_success(processor, large_file_env):
+    large_file_env.iter_chunks.return_value = make_chunks(True, True)
+
+    transcript, error = run_large_file(processor)
+
+    assert transcript == "[00:05] Speaker 1: files/chunk0\n[02:05] Speaker 1: files/chunk1"
     assert error is None
-    mock_api_process_chunk.assert_called_once_with(
-        processor.client, processor.model_name, chunk_path, ANY, # ANY for prompt
-        f"audio/{MOCK_FILE_FORMAT}", chunk_index
+    large_file_env.iter_chunks.assert_called_once_with(
+        MOCK_FILE_PATH, MOCK_FILE_FORMAT, CHUNK_DURATION_MS, skip_silent=True
+    )
+    large_file_env.fallback.assert_not_called()
+
+def test_process_audio_large_file_silence_not_counted(processor, large_file_env):
+    # 3 of 5 chunks would be below the success threshold if silence counted
+    large_file_env.iter_chunks.return_value = make_chunks(True, False, True, False, True)
+
+    transcript, error = run_large_file(processor)
+
+    assert transcript.count("Speaker 1") == 3
+    large_file_env.fallback.assert_not_called()
+
+def test_process_audio_large_file_all_silent_falls_back(processor, large_file_env, mock_gemini_client):
+    large_file_env.iter_chunks.return_value = make_chunks(False, False)
+
+    assert run_large_file(processor) == ("Full file transcript", None)
+    mock_gemini_client.files.upload.assert_not_called()
+    large_file_env.fallback.assert_called_once_with(MOCK_FILE_PATH, MOCK_FILE_FORMAT, ANY)
+
+def test_process_audio_large_file_partial_failure_falls_back(processor, large_file_env, mock_gemini_client):
+    large_file_env.iter_chunks.return_value = make_chunks(True, True, True, True, True)
+    transcribe = mock_gemini_client.models.generate_content.side_effect
+
+    def transcribe_first_chunk_only(model, contents):
+        if contents[1].name != "files/chunk0":
+            raise Exception("API error")
+        return transcribe(model, contents)
+
+    mock_gemini_client.models.generate_content.side_effect = transcribe_first_chunk_only
+
+    assert run_large_file(processor) == ("Full file transcript", None)
+    large_file_env.fallback.assert_called_once()
+    # Every uploaded chunk is deleted whether or not it was transcribed
+    assert mock_gemini_client.files.delete.call_count == 5
+
+def test_process_audio_large_file_load_error(processor, large_file_env):
+    def unreadable(*args, **kwargs):
+        raise ValueError("Failed to load audio data")
+        yield
+
+    large_file_env.iter_chunks.side_effect = unreadable
+
+    assert run_large_file(processor) == (None, "Failed to split audio file.")
+    large_file_env.fallback.assert_not_called()
+
+def test_process_audio_large_file_callback_error_propagates(processor, large_file_env):
+    chunks = make_chunks(True, True, True)
+    large_file_env.iter_chunks.return_value = chunks
+    processor.chunk_callback = MagicMock(side_effect=ValueError("Callback failed"))
+
+    # Not mistaken for an audio loading failure
+    with pytest.raises(ValueError, match="Callback failed"):
+        run_large_file(processor)
+    # The chunk generator is closed rather than left suspended
+    assert chunks.gi_frame is None
+
+# --- Tests for process_transcription_task's transcript cache ---
+
+@pytest.fixture
+def cache_env(mocker, monkeypatch):
+    """Empty transcript cache of two entries, with the API run mocked out."""
+    monkeypatch.setattr(transcription_processor, '_transcript_cache', OrderedDict())
+    monkeypatch.setattr(transcription_processor, 'TRANSCRIPT_CACHE_MAX_ENTRIES', 2)
+    mocker.patch('state_manager.st.session_state', {})
+    return SimpleNamespace(
+        run=mocker.patch('transcription_processor._run_transcription_task',
+                         return_value={"success": True, "transcript": "Transcript"}),
     )
-    # adjust_chunk_timestamps needs the raw transcript and the start_offset_ms
-    # The start_offset_ms is calculated as chunk_index * CHUNK_DURATION_MS
-    expected_offset = chunk_index * CHUNK_DURATION_MS
-    mock_adjust_timestamps.assert_called_once_with("Raw chunk transcript", expected_offset)
 
+def make_upload(data, file_id):
+    upload = MagicMock(file_id=file_id)
+    upload.getbuffer.side_effect = lambda: memoryview(data)
+    return upload
 
-@patch('transcription_processor.api_client.process_audio_chunk')
-def test_process_single_chunk_api_failure(mock_api_process_chunk, processor):
-    chunk_path = "test_chunk.mp3"
-    chunk_index = 0
+def transcribe(upload, model_name="gemini-test-model", progress_callback=None):
+    return process_transcription_task(None, model_name, upload, MOCK_METADATA,
+                                      MOCK_NUM_SPEAKERS, progress_callback)
+
+def test_process_transcription_task_cache_hit(cache_env):
+    progress_callback = MagicMock()
+    upload = make_upload(b"audio", "file-1")
     
-    mock_api_process_chunk.return_value = (None, "API error during chunk processing")
+    assert transcribe(upload) == {"success": True, "transcript": "Transcript"}
+    # The same audio under a new upload is still a hit, and runs no callbacks
+    assert transcribe(make_upload(b"audio", "file-2"), progress_callback=progress_callback) == {
+        "success": True, "transcript": "Transcript"
+    }
     
-    transcript, error = processor._process_single_chunk(
-        chunk_path, chunk_index, MOCK_FILE_FORMAT, MOCK_METADATA, MOCK_NUM_SPEAKERS
-    )
+    cache_env.run.assert_called_once()
+    progress_callback.assert_not_called()
+
+def test_process_transcription_task_hashes_upload_once(cache_env):
+    upload = make_upload(b"audio", "file-1")
     
-    assert transcript is None
-    assert "API error during chunk processing" in error
-    mock_api_process_chunk.assert_called_once()
-
-# A test for prompt generation could also be useful if it's complex
-def test_prompt_generation_in_processor(processor):
-    # Access the prompt template from the processor instance
-    prompt_template = processor.prompt_template 
-    # If the prompt_template was not set (e.g. None), this test would fail or need adjustment
-    assert prompt_template is not None 
+    transcribe(upload)
+    transcribe(upload, model_name="other-model")
+    
+    assert upload.getbuffer.call_count == 1
+    assert cache_env.run.call_count == 2
+
+def test_process_transcription_task_failure_not_cached(cache_env):
+    cache_env.run.return_value = {"success": False, "error": "API error"}
+    upload = make_upload(b"audio", "file-1")
+    
+    assert transcribe(upload) == {"success": False, "error": "API error"}
+    assert transcribe(upload) == {"success": False, "error": "API error"}
+    assert cache_env.run.call_count == 2
+
+def test_process_transcription_task_evicts_least_recently_used(cache_env):
+    uploads = [make_upload(f"audio {i}".encode(), f"file-{i}") for i in range(3)]
+    
+    transcribe(uploads[0])
+    transcribe(uploads[1])
+    transcribe(uploads[0])  # Hit: upload 1 is now the least recently used
+    transcribe(uploads[2])
+    assert cache_env.run.call_count == 3
     
-    # Render the prompt with some test data
-    # Ensure the prompt_template is a MagicMock that can be called if it was mocked at processor creation
-    if isinstance(prompt_template, MagicMock):
-        prompt_template.render.return_value = "Rendered Prompt"
-        rendered_prompt = prompt_template.render(metadata=MOCK_METADATA, num_speakers=MOCK_NUM_SPEAKERS)
-        assert "Rendered Prompt" in rendered_prompt
-        prompt_template.render.assert_called_once_with(metadata=MOCK_METADATA, num_speakers=MOCK_NUM_SPEAKERS)
-    else:
-        # This case would apply if a real Template object was loaded and passed to the processor
-        # For this set of tests, the prompt_template is mocked in the fixture.
-        pass
-
-```
+    transcribe(uploads[0])
+    assert cache_env.run.call_count == 3
+    transcribe(uploads[1])
+    assert cache_env.run.call_count == 4
+    assert len(transcription_processor._transcript_cache) == 2
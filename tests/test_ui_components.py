@@ -0,0 +1,86 @@
+import pytest
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import ui_components
+from state_manager import DEFAULT_STATE
+
+
+class FakeSessionState(dict):
+    """Dict with the attribute access of st.session_state."""
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+@pytest.fixture
+def editor(mocker, monkeypatch):
+    """
+    Drive render_transcript_editor through reruns with fake widgets.
+
+    The text area reads its value from session state like the real widget and
+    loses its key on a rerun where it is not rendered. The advanced editor
+    returns its mount value until text is applied in it under its key.
+    """
+    session_state = FakeSessionState(DEFAULT_STATE)
+    # As left by main.py after a transcription finishes
+    session_state.update(transcript_text="[00:01] Original",
+                         transcript_editor_content="[00:01] Original")
+    widgets = SimpleNamespace(advanced=False, save=False, ace_applied={}, ace_mounts=[])
+
+    def fake_st_ace(value, key, **kwargs):
+        widgets.ace_mounts.append((key, value))
+        return widgets.ace_applied.get(key, value)
+
+    fake_st = MagicMock()
+    fake_st.session_state = session_state
+    fake_st.toggle.side_effect = lambda *args, **kwargs: widgets.advanced
+    fake_st.button.side_effect = lambda *args, **kwargs: widgets.save
+    fake_st.text_area.side_effect = lambda *args, key, **kwargs: session_state[key]
+    mocker.patch.object(ui_components, 'st', fake_st)
+    monkeypatch.setitem(sys.modules, 'streamlit_ace', SimpleNamespace(st_ace=fake_st_ace))
+    render = getattr(ui_components.render_transcript_editor, '__wrapped__',
+                     ui_components.render_transcript_editor)
+
+    def rerun(advanced=False, save=False):
+        widgets.advanced, widgets.save = advanced, save
+        fake_st.text_area.reset_mock()
+        render()
+        if not fake_st.text_area.called:
+            session_state.pop("transcript_text_area", None)
+
+    return SimpleNamespace(rerun=rerun, state=session_state, widgets=widgets)
+
+
+def test_saved_edits_survive_switching_to_advanced_editor(editor):
+    editor.rerun()
+    editor.state["transcript_text_area"] = "[00:01] Edited"
+    editor.rerun(save=True)
+    assert editor.state.edited_transcript == "[00:01] Edited"
+
+    # The advanced editor mounts with the saved text, so saving there keeps it
+    editor.rerun(advanced=True)
+    assert editor.widgets.ace_mounts[-1][1] == "[00:01] Edited"
+    editor.rerun(advanced=True, save=True)
+    assert editor.state.edited_transcript == "[00:01] Edited"
+
+
+def test_unsaved_text_survives_switching_editors(editor):
+    editor.rerun()
+    editor.state["transcript_text_area"] = "[00:01] Typed"
+    editor.rerun()
+    editor.rerun(advanced=True)
+    ace_key, ace_value = editor.widgets.ace_mounts[-1]
+    assert ace_value == "[00:01] Typed"
+
+    editor.widgets.ace_applied[ace_key] = "[00:01] Typed in advanced editor"
+    editor.rerun(advanced=True)
+    editor.rerun()
+    assert editor.state.transcript_text_area == "[00:01] Typed in advanced editor"
+    assert editor.state.edited_transcript is None
@@ -5,11 +5,37 @@ This module provides functions for handling transcripts including formatting and
 import re
 import json
 import logging
-from typing import List, Dict, Any, Optional
-from datetime import timedelta
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # Optional; the standard library json module is used instead
+    orjson = None
 
 from config import CHUNK_DURATION_MS, DEFAULT_SUBTITLE_DURATION_SECONDS, VALID_EXPORT_FORMATS
 
+# "[MM:SS] rest" or "[HH:MM:SS] rest"; the rest keeps its leading whitespace
+_TIMESTAMP_LINE_RE = re.compile(r'\[([\d:]+)\](.*)')
+
+# Same, with the whitespace after the timestamp dropped from the content
+_TIMESTAMP_CONTENT_RE = re.compile(r'\[([\d:]+)\]\s*(.*)')
+
+# A timestamp already in the zero-padded [MM:SS] or [HH:MM:SS] form
+_CANONICAL_TIMESTAMP_RE = re.compile(r'\[(?:\d\d:)?[0-5]\d:\d\d\]')
+
+# Shared by every JSON export when orjson is missing; json.dumps would build
+# a new encoder per call because of the indent argument
+_JSON_ENCODER = json.JSONEncoder(indent=2)
+
+# Classifies the content after a timestamp in one match: a bracketed
+# event such as "[MUSIC]", a "Speaker N: text" utterance, or anything else
+_CONTENT_RE = re.compile(
+    r'\[+(?P<event>.*?)\]+$'
+    r'|(?P<speaker>Speaker\s+\w+)\s*:\s*(?P<speech>.*)'
+    r'|(?P<other>.*)'
+)
+
 def adjust_chunk_timestamps(transcription: str, chunk_index: int, 
                            chunk_duration_ms: int = CHUNK_DURATION_MS) -> str:
     """
@@ -32,11 +58,17 @@ def adjust_chunk_timestamps(transcription: str, chunk_index: int,
     
     for line_num, line in enumerate(lines, 1):
         # Skip empty lines and [END] marker
-        if not line.strip() or line.strip() == '[END]':
+        stripped = line.strip()
+        if not stripped or stripped == '[END]':
+            continue
+        
+        # With no offset, a zero-padded timestamp would be rewritten unchanged
+        if base_minutes == 0 and _CANONICAL_TIMESTAMP_RE.match(line):
+            adjusted_lines.append(line)
             continue
             
         # Find timestamp pattern [MM:SS] or [HH:MM:SS]
-        timestamp_match = re.match(r'\[([\d:]+)\](.*)', line)
+        timestamp_match = _TIMESTAMP_LINE_RE.match(line)
         if timestamp_match:
             # Extract timestamp and content
             timestamp = timestamp_match.group(1)
@@ -109,33 +141,108 @@ def combine_transcriptions(transcription_chunks: List[str]) -> str:
     
     return '\n'.join(combined_lines)
 
-def convert_timestamp_to_srt(timestamp: str) -> str:
+def _timestamp_to_seconds(timestamp: str) -> Optional[int]:
     """
-    Convert [MM:SS] or [HH:MM:SS] format to SRT format (HH:MM:SS,mmm).
+    Parse an MM:SS or HH:MM:SS timestamp, with or without brackets.
     
     Args:
-        timestamp: Timestamp string in [MM:SS] or [HH:MM:SS] format
+        timestamp: Timestamp string such as "[01:15]" or "01:02:03"
         
     Returns:
-        Timestamp string in SRT format
+        Offset in whole seconds, or None if the timestamp is malformed
     """
+    parts = timestamp.strip('[]').split(':')
     try:
-        timestamp = timestamp.strip('[]')
-        parts = timestamp.split(':')
-        
         if len(parts) == 3:
             hours, minutes, seconds = map(int, parts)
         elif len(parts) == 2:
             hours = 0
             minutes, seconds = map(int, parts)
         else:
-            return "00:00:00,000"
-            
-        time_delta = timedelta(hours=hours, minutes=minutes, seconds=seconds)
-        return f"{str(time_delta).zfill(8)},000"
-    except Exception as e:
-        logging.warning(f"Error converting timestamp {timestamp} to SRT format: {e}")
+            return None
+    except ValueError:
+        return None
+    return hours * 3600 + minutes * 60 + seconds
+
+def convert_timestamp_to_srt(timestamp: str) -> str:
+    """
+    Convert [MM:SS] or [HH:MM:SS] format to SRT format (HH:MM:SS,mmm).
+    
+    Args:
+        timestamp: Timestamp string in [MM:SS] or [HH:MM:SS] format
+        
+    Returns:
+        Timestamp string in SRT format
+    """
+    total_seconds = _timestamp_to_seconds(timestamp)
+    if total_seconds is None:
+        logging.warning(f"Error converting timestamp {timestamp} to SRT format")
         return "00:00:00,000"
+    return _format_srt_time(total_seconds)
+
+def _dumps_json(data: Any) -> str:
+    """
+    Serialize export data as JSON indented by two spaces.
+    
+    orjson is used when installed, as it is several times faster than the
+    standard library on long transcripts; both produce equivalent JSON.
+    
+    Args:
+        data: JSON-serializable data
+        
+    Returns:
+        JSON string
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode('utf-8')
+    return _JSON_ENCODER.encode(data)
+
+def _format_srt_time(total_seconds: int) -> str:
+    """
+    Format a whole number of seconds as an SRT timecode (HH:MM:SS,000).
+    
+    Plain integer arithmetic is used instead of building timedelta objects
+    for every subtitle entry.
+    
+    Args:
+        total_seconds: Offset from the start of the audio in seconds
+        
+    Returns:
+        Timestamp string in SRT format
+    """
+    hours, remainder = divmod(total_seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},000"
+
+@lru_cache(maxsize=4)
+def _parse_transcript_lines(transcript_text: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """
+    Parse the timestamped lines of a transcript into parallel columns.
+    
+    The result is memoized so exporting the same transcript in several
+    formats parses it only once.
+    
+    Args:
+        transcript_text: Transcript text to parse
+        
+    Returns:
+        Tuple of (timestamps without brackets, line contents after the timestamp)
+    """
+    timestamps = []
+    contents = []
+    
+    for line in transcript_text.split('\n'):
+        stripped = line.strip()
+        if not stripped or stripped == '[END]':
+            continue
+        
+        # Parse timestamp and content
+        timestamp_match = _TIMESTAMP_CONTENT_RE.match(line)
+        if timestamp_match:
+            timestamps.append(timestamp_match.group(1))
+            contents.append(timestamp_match.group(2))
+    
+    return tuple(timestamps), tuple(contents)
 
 def format_transcript_for_export(transcript_text: str, format: str = 'txt') -> str:
     """
@@ -158,95 +265,67 @@ def format_transcript_for_export(transcript_text: str, format: str = 'txt') -> s
     
     if not transcript_text:
         if format == 'json':
-            return json.dumps({"transcript": []}, indent=2)
+            return _dumps_json({"transcript": []})
         return ""
         
     if format == 'txt':
         return transcript_text
 
     elif format == 'srt':
-        lines = transcript_text.split('\n')
+        timestamps, contents = _parse_transcript_lines(transcript_text)
         srt_lines = []
         counter = 1
 
-        for line in lines:
-            if not line.strip() or line.strip() == '[END]':
-                continue
-
-            # Parse timestamp and content
-            timestamp_match = re.match(r'\[([\d:]+)\]\s*(.*)', line)
-            if timestamp_match:
-                timestamp = timestamp_match.group(1)
-                content = timestamp_match.group(2)
+        for timestamp, content in zip(timestamps, contents):
+            # Parse the timestamp once for both start and end times;
+            # malformed ones start at zero
+            start_seconds = _timestamp_to_seconds(timestamp) or 0
+            
+            # End time is start time + configured duration
+            start_time = _format_srt_time(start_seconds)
+            end_time = _format_srt_time(start_seconds + DEFAULT_SUBTITLE_DURATION_SECONDS)
 
-                # Convert timestamp to SRT format
-                start_time = convert_timestamp_to_srt(f"[{timestamp}]")
-                
-                # Compute end time as start time + configured duration
-                parts = list(map(int, timestamp.split(':')))
-                if len(parts) == 3:
-                    hours, minutes, seconds = parts
-                elif len(parts) == 2:
-                    hours = 0
-                    minutes, seconds = parts
-                else:
-                    hours = minutes = seconds = 0
-                    
-                start_delta = timedelta(hours=hours, minutes=minutes, seconds=seconds)
-                end_delta = start_delta + timedelta(seconds=DEFAULT_SUBTITLE_DURATION_SECONDS)
-                end_time = f"{str(end_delta).zfill(8)},000"
-
-                # Format SRT entry
-                srt_lines.extend([
-                    str(counter),
-                    f"{start_time} --> {end_time}",
-                    content.strip(),
-                    ""  # Empty line between entries
-                ])
-                counter += 1
+            # Format SRT entry
+            srt_lines.extend([
+                str(counter),
+                f"{start_time} --> {end_time}",
+                content.strip(),
+                ""  # Empty line between entries
+            ])
+            counter += 1
 
         return "\n".join(srt_lines)
 
     elif format == 'json':
-        lines = transcript_text.split('\n')
+        timestamps, contents = _parse_transcript_lines(transcript_text)
         transcript_data = []
 
-        for line in lines:
-            if not line.strip() or line.strip() == '[END]':
-                continue
-
-            # Parse timestamp and content
-            timestamp_match = re.match(r'\[([\d:]+)\]\s*(.*)', line)
-            if timestamp_match:
-                timestamp = timestamp_match.group(1)
-                content = timestamp_match.group(2)
-
-                # Check if it's a special event (like music or sound effect)
-                if content.startswith('[') and content.endswith(']'):
-                    entry = {
-                        "timestamp": timestamp,
-                        "type": "event",
-                        "content": content.strip('[]')
-                    }
-                else:
-                    # Parse speaker and text
-                    speaker_match = re.match(r'([^:]+):\s*(.*)', content)
-                    if speaker_match:
-                        entry = {
-                            "timestamp": timestamp,
-                            "type": "speech",
-                            "speaker": speaker_match.group(1).strip(),
-                            "content": speaker_match.group(2).strip()
-                        }
-                    else:
-                        entry = {
-                            "timestamp": timestamp,
-                            "type": "other",
-                            "content": content.strip()
-                        }
-
-                transcript_data.append(entry)
-
-        return json.dumps({"transcript": transcript_data}, indent=2)
+        for timestamp, content in zip(timestamps, contents):
+            match = _CONTENT_RE.match(content)
+            kind = match.lastgroup
+            if kind == 'event':
+                # A special event, like music or a sound effect
+                entry = {
+                    "timestamp": timestamp,
+                    "type": "event",
+                    "content": match.group('event')
+                }
+            elif kind == 'speech':
+                entry = {
+                    "timestamp": timestamp,
+                    "type": "speech",
+                    "speaker": match.group('speaker'),
+                    "content": match.group('speech').strip()
+                }
+            else:
+                entry = {
+                    "timestamp": timestamp,
+                    "type": "other",
+                    "content": content.strip()
+                }
+
+            transcript_data.append(entry)
+
+        return _dumps_json({"transcript": transcript_data})
 
     return transcript_text  # Default to plain text for unknown formats
@@ -2,23 +2,31 @@
 Transcription processing module for ExactTranscriber.
 This module contains the core logic for processing audio transcriptions.
 """
+import hashlib
 import logging
-import tempfile
 import os
+import itertools
+import threading
 import concurrent.futures
-from typing import Dict, Any, Optional, Tuple, List
+from collections import OrderedDict
+from typing import BinaryIO, Dict, Any, Iterator, Optional, Tuple, List, Callable
 
 import streamlit as st
-import google.generativeai as genai
 
 from config import (
     CHUNK_DURATION_MS,
+    CHUNK_THRESHOLD_MB,
+    CHUNK_TRANSCODE_FORMATS,
     MIME_TYPE_MAPPING,
     MAX_WORKERS,
-    MIN_CHUNK_SUCCESS_PERCENTAGE
+    MAX_WORKERS_LIMIT,
+    MIN_CHUNK_SUCCESS_PERCENTAGE,
+    TRANSCRIPT_CACHE_MAX_ENTRIES,
+    UPLOAD_TYPE_MAPPING
 )
-from api_client import get_transcription_prompt
-from file_utils import chunk_audio_file, cleanup_chunks, cleanup_file
+from api_client import extract_response_text, render_transcription_prompt
+from file_utils import cleanup_file, iter_audio_chunks
+from state_manager import get_state, set_state
 from transcript_utils import adjust_chunk_timestamps, combine_transcriptions
 from utils import sanitize_error_message
 
@@ -26,9 +34,16 @@ from utils import sanitize_error_message
 class TranscriptionProcessor:
     """Handles the transcription processing logic."""
     
-    def __init__(self, client: Any, model_name: str):
+    def __init__(self, client: Any, model_name: str,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 chunk_callback: Optional[Callable[[int, str], None]] = None):
         self.client = client
         self.model_name = model_name
+        # Called as progress_callback(done, total) each time a chunk finishes
+        self.progress_callback = progress_callback
+        # Called as chunk_callback(chunk_index, text) with each transcribed chunk,
+        # in completion order, so partial results can be shown before the end
+        self.chunk_callback = chunk_callback
         self.logger = logging.getLogger(__name__)
     
     def process_audio(self, file_path: str, file_format: str, 
@@ -47,12 +62,11 @@ class TranscriptionProcessor:
         Returns:
             Tuple of (transcript_text, error_message)
         """
-        # Generate prompt
-        prompt_template = get_transcription_prompt(metadata)
-        prompt = prompt_template.render(num_speakers=num_speakers, metadata=metadata)
+        # Generate prompt once; every chunk request shares the same string
+        prompt = render_transcription_prompt(metadata, num_speakers)
         
         # Determine if we need to chunk
-        large_file = file_size_mb > 20
+        large_file = file_size_mb > CHUNK_THRESHOLD_MB
         
         if large_file:
             return self._process_large_file(file_path, file_format, prompt)
@@ -86,72 +100,145 @@ class TranscriptionProcessor:
                 contents=[prompt, file_obj]
             )
             
-            response_text = (response.text if hasattr(response, 'text') 
-                           else response.candidates[0].content.parts[0].text)
+            response_text = extract_response_text(response)
             return response_text, None
             
         except Exception as transcribe_err:
             error_msg = sanitize_error_message(str(transcribe_err))
             self.logger.error(f"Transcription API error: {error_msg}")
             return None, f"Transcription failed: {error_msg}"
+        finally:
+            self._delete_uploaded_file(file_obj)
+    
+    def _delete_uploaded_file(self, file_obj: Any) -> None:
+        """Delete an uploaded file from the Files API once it is no longer needed."""
+        try:
+            self.client.files.delete(name=file_obj.name)
+        except Exception as delete_err:
+            # Uploaded files expire on their own, so this is not fatal
+            self.logger.warning(f"Failed to delete uploaded file: {sanitize_error_message(str(delete_err))}")
     
     def _process_large_file(self, file_path: str, file_format: str,
                            prompt: str) -> Tuple[Optional[str], Optional[str]]:
         """Process a large audio file by chunking."""
-        # Read file data
-        with open(file_path, 'rb') as f:
-            audio_data = f.read()
-        
-        # Chunk the audio
-        chunk_paths, num_chunks = chunk_audio_file(audio_data, file_format, CHUNK_DURATION_MS)
-        if num_chunks == 0 or not chunk_paths:
-            return None, "Failed to split audio file."
+        # Chunks of uncompressed formats are re-encoded by iter_audio_chunks
+        chunk_format = CHUNK_TRANSCODE_FORMATS.get(file_format, file_format)
+        chunk_mime_type = MIME_TYPE_MAPPING.get(chunk_format, f"audio/{chunk_format}")
         
+        # Chunk the audio, letting ffmpeg read the temporary file from disk.
+        # Chunks are kept in memory and handed over as soon as each is encoded,
+        # and silent chunks come back as None so they are never uploaded.
+        chunks = iter_audio_chunks(file_path, file_format, CHUNK_DURATION_MS, skip_silent=True)
         try:
-            # Process chunks in parallel
-            all_transcriptions = self._process_chunks_parallel(
-                chunk_paths, num_chunks, prompt, file_format
-            )
+            # The audio is loaded when the first chunk is requested; only that
+            # step's ValueError means the file could not be split
+            try:
+                first_chunk = next(chunks, None)
+            except ValueError:
+                return None, "Failed to split audio file."
             
+            all_transcriptions, num_audible = self._process_chunks_parallel(
+                itertools.chain([first_chunk] if first_chunk else [], chunks),
+                prompt, chunk_mime_type
+            )
+        finally:
+            chunks.close()
+        
+        if num_audible:
             # Combine results
-            if all_transcriptions and len(all_transcriptions) >= num_chunks * MIN_CHUNK_SUCCESS_PERCENTAGE:
+            if all_transcriptions and len(all_transcriptions) >= num_audible * MIN_CHUNK_SUCCESS_PERCENTAGE:
                 combined_transcription = combine_transcriptions(all_transcriptions)
                 return combined_transcription, None
-            else:
-                # Fallback to full file processing
-                self.logger.info("Falling back to full audio transcription due to chunk errors.")
-                return self._process_small_file(file_path, file_format, prompt)
-                
-        finally:
-            # Always cleanup chunks
-            cleanup_chunks(chunk_paths)
+            
+            self.logger.info("Falling back to full audio transcription due to chunk errors.")
+        else:
+            self.logger.info("No audible chunks detected; transcribing the full file instead.")
+        
+        # Fallback to full file processing
+        return self._process_small_file(file_path, file_format, prompt)
     
-    def _process_chunks_parallel(self, chunk_paths: List[str], num_chunks: int,
-                                prompt: str, file_format: str) -> List[str]:
-        """Process audio chunks in parallel."""
-        chunk_args = [(i, chunk_path) for i, chunk_path in enumerate(chunk_paths)]
-        all_transcriptions = []
+    def _process_chunks_parallel(self, chunks: Iterator[Tuple[int, int, Optional[BinaryIO]]],
+                                prompt: str, mime_type: str) -> Tuple[List[str], int]:
+        """
+        Process audio chunks in parallel as they are produced.
         
-        def process_chunk_worker(args):
-            i, chunk_path = args
-            return self._process_single_chunk(i, chunk_path, prompt, file_format, num_chunks)
+        Chunks are pulled from the iterator only while fewer than max_workers
+        are in flight, and finished chunks are collected between pulls, so
+        callbacks fire while later chunks are still encoding and only a
+        bounded number of encoded chunks wait in memory. Silent (None) chunks
+        are skipped.
+        
+        Returns:
+            Tuple of (transcriptions in chunk order, number of non-silent chunks)
+        """
+        # Results are keyed by chunk index so they can be collected in
+        # completion order without losing the original ordering
+        results: Dict[int, str] = {}
+        num_chunks = num_silent = done = 0
+        chunks_left = True
+        # Submitted futures that have not been collected, with their chunks
+        in_flight: Dict[concurrent.futures.Future, Tuple[int, BinaryIO]] = {}
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            results = executor.map(process_chunk_worker, chunk_args)
-            all_transcriptions = [res for res in results if res is not None]
+        # Threads rather than processes: each worker spends nearly all its time
+        # blocked on upload/generate_content network calls, which release the
+        # GIL, so concurrency is bounded by the API quota, not the interpreter.
+        # The pool only starts threads as work is submitted, so a file with
+        # few chunks never gets more threads than it has chunks.
+        max_workers = max(1, min(MAX_WORKERS, MAX_WORKERS_LIMIT))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                while True:
+                    if chunks_left and len(in_flight) < max_workers:
+                        item = next(chunks, None)
+                        if item is None:
+                            chunks_left = False
+                        else:
+                            index, num_chunks, chunk = item
+                            if chunk is None:
+                                num_silent += 1
+                            else:
+                                future = executor.submit(self._process_single_chunk, index, chunk,
+                                                         prompt, mime_type, num_chunks)
+                                in_flight[future] = (index, chunk)
+                        # Collect whatever has already finished, then keep encoding
+                        timeout = 0
+                    elif in_flight:
+                        timeout = None
+                    else:
+                        break
+                    
+                    finished, _ = concurrent.futures.wait(
+                        in_flight, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in finished:
+                        index, _ = in_flight.pop(future)
+                        result = future.result()
+                        done += 1
+                        if result is not None:
+                            results[index] = result
+                            if self.chunk_callback:
+                                self.chunk_callback(index, result)
+                        # Chunks not yet encoded count towards the total, which
+                        # drops again for each one that turns out to be silent
+                        if self.progress_callback:
+                            self.progress_callback(done, num_chunks - num_silent)
+            finally:
+                # After an error, chunks whose work never started are closed
+                # here; started ones are closed by _process_single_chunk
+                for future, (_, chunk) in in_flight.items():
+                    if future.cancel():
+                        chunk.close()
         
-        return all_transcriptions
+        return [results[i] for i in sorted(results)], num_chunks - num_silent
     
-    def _process_single_chunk(self, chunk_index: int, chunk_path: str,
-                             prompt: str, file_format: str, 
+    def _process_single_chunk(self, chunk_index: int, chunk: BinaryIO,
+                             prompt: str, mime_type: str, 
                              num_chunks: int) -> Optional[str]:
         """Process a single audio chunk."""
         try:
-            mime_type = MIME_TYPE_MAPPING.get(file_format, f"audio/{file_format}")
-            
             # Upload chunk
             try:
-                chunk_file = self.client.files.upload(file=chunk_path, config={"mimeType": mime_type})
+                chunk_file = self.client.files.upload(file=chunk, config={"mimeType": mime_type})
             except Exception as upload_err:
                 error_msg = sanitize_error_message(str(upload_err))
                 self.logger.error(f"Failed to upload chunk {chunk_index+1}: {error_msg}")
@@ -161,6 +248,10 @@ class TranscriptionProcessor:
                 if "quota" in error_msg.lower():
                     raise ValueError(f"API quota exceeded") # Generic message
                 raise ValueError(f"Chunk upload failed") # Generic message
+            finally:
+                # Only the uploaded copy is needed from here on, so release the
+                # in-memory chunk instead of holding every chunk until the end
+                chunk.close()
             
             # Transcribe chunk
             try:
@@ -172,11 +263,14 @@ class TranscriptionProcessor:
                 error_msg = sanitize_error_message(str(transcribe_err))
                 self.logger.error(f"Failed to transcribe chunk {chunk_index+1}: {error_msg}")
                 raise ValueError(f"Transcription API error") # Generic message
+            finally:
+                # Each chunk is uploaded exactly once and referenced by its handle,
+                # so it can be removed as soon as its request has completed
+                self._delete_uploaded_file(chunk_file)
             
             # Extract text
             try:
-                chunk_text = (chunk_response.text if hasattr(chunk_response, 'text') 
-                            else chunk_response.candidates[0].content.parts[0].text)
+                chunk_text = extract_response_text(chunk_response)
             except Exception as extract_err:
                 # This error is internal, not directly user-facing, but log it cleanly.
                 self.logger.error(f"Failed to extract text from chunk {chunk_index+1} response: {str(extract_err)}")
@@ -195,10 +289,12 @@ class TranscriptionProcessor:
 # Removed _sanitize_error method by deleting its definition.
 
 
-def process_transcription_task(client: Any, model_name: str, uploaded_file,
-                              metadata: Dict[str, Any], num_speakers: int) -> Dict[str, Any]:
+def _run_transcription_task(client: Any, model_name: str, uploaded_file,
+                            metadata: Dict[str, Any], num_speakers: int,
+                            progress_callback: Optional[Callable[[int, int], None]] = None,
+                            chunk_callback: Optional[Callable[[int, str], None]] = None) -> Dict[str, Any]:
     """
-    Process a transcription task and return results.
+    Run a transcription task against the API and return results.
     
     Args:
         client: Gemini client
@@ -206,27 +302,29 @@ def process_transcription_task(client: Any, model_name: str, uploaded_file,
         uploaded_file: Streamlit uploaded file object
         metadata: Transcription metadata
         num_speakers: Number of speakers
+        progress_callback: Optional callable receiving (chunks_done, total_chunks)
+            as chunks of a large file finish
+        chunk_callback: Optional callable receiving (chunk_index, chunk_text)
+            as chunks of a large file finish
         
     Returns:
         Dictionary with transcription result or error
     """
-    processor = TranscriptionProcessor(client, model_name)
+    processor = TranscriptionProcessor(client, model_name, progress_callback, chunk_callback)
     file_path = None
     
     try:
-        # Get audio data
-        audio_data = uploaded_file.getvalue()
-        file_format = uploaded_file.type.split('/')[-1]
-        if file_format == 'mpeg':
-            file_format = 'mp3'
-        elif file_format == 'x-wav':
-            file_format = 'wav'
+        # Unknown upload types fall back to the file extension
+        file_format, _ = UPLOAD_TYPE_MAPPING.get(
+            uploaded_file.type,
+            (os.path.splitext(uploaded_file.name)[1].lstrip('.').lower(), uploaded_file.type)
+        )
         
         file_size_mb = uploaded_file.size / (1024 * 1024)
         
-        # Create temporary file
+        # Stream the upload into a temporary file instead of copying it into memory
         from file_utils import create_temp_file
-        file_path, success = create_temp_file(audio_data, uploaded_file.name)
+        file_path, success = create_temp_file(uploaded_file, uploaded_file.name)
         if not success or not file_path:
             # This is an internal error, but sanitize if it were to become user-facing
             raise Exception(sanitize_error_message("Failed to create temporary file for audio processing"))
@@ -244,10 +342,84 @@ def process_transcription_task(client: Any, model_name: str, uploaded_file,
             
     except Exception as e:
         error_str = str(e)
-        self.logger.error(f"Unexpected error in transcription task: {sanitize_error_message(error_str)}", exc_info=True)
+        logging.getLogger(__name__).error(f"Unexpected error in transcription task: {sanitize_error_message(error_str)}", exc_info=True)
         return {"success": False, "error": sanitize_error_message(error_str)}
         
     finally:
         # Cleanup temporary file
         if file_path:
-            cleanup_file(file_path)
\ No newline at end of file
+            cleanup_file(file_path)
+
+# Finished transcripts keyed by (audio SHA-256, model, metadata items, speakers),
+# least recently used first. Not st.cache_data: a run drives the UI callbacks,
+# and Streamlit would replay those elements on every cache hit. Shared by every
+# session thread, so all access goes through the lock.
+_transcript_cache: "OrderedDict[Tuple[Any, ...], str]" = OrderedDict()
+_transcript_cache_lock = threading.Lock()
+
+
+def _get_audio_digest(uploaded_file) -> str:
+    """
+    Return the SHA-256 hex digest of an upload, hashing it once per file.
+    
+    The digest is remembered in session state against the upload's file_id,
+    so repeated clicks on the same upload do not rehash up to MAX_FILE_SIZE
+    bytes each time.
+    """
+    file_id = getattr(uploaded_file, "file_id", None)
+    memo = get_state("audio_digest")
+    if file_id is not None and memo and memo[0] == file_id:
+        return memo[1]
+    
+    with uploaded_file.getbuffer() as view:
+        audio_sha = hashlib.sha256(view).hexdigest()
+    if file_id is not None:
+        set_state("audio_digest", (file_id, audio_sha))
+    return audio_sha
+
+
+def process_transcription_task(client: Any, model_name: str, uploaded_file,
+                              metadata: Dict[str, Any], num_speakers: int,
+                              progress_callback: Optional[Callable[[int, int], None]] = None,
+                              chunk_callback: Optional[Callable[[int, str], None]] = None) -> Dict[str, Any]:
+    """
+    Process a transcription task and return results.
+    
+    Identical audio transcribed with the same model, metadata and speaker
+    count is served from cache instead of being sent to the API again.
+    
+    Args:
+        client: Gemini client
+        model_name: Model ID to use
+        uploaded_file: Streamlit uploaded file object
+        metadata: Transcription metadata
+        num_speakers: Number of speakers
+        progress_callback: Optional callable receiving (chunks_done, total_chunks)
+            as chunks of a large file finish
+        chunk_callback: Optional callable receiving (chunk_index, chunk_text)
+            as chunks of a large file finish, with timestamps already adjusted
+        
+    Returns:
+        Dictionary with transcription result or error
+    """
+    audio_sha = _get_audio_digest(uploaded_file)
+    cache_key = (audio_sha, model_name, tuple(sorted((metadata or {}).items())), num_speakers)
+    with _transcript_cache_lock:
+        cached_transcript = _transcript_cache.get(cache_key)
+        if cached_transcript is not None:
+            _transcript_cache.move_to_end(cache_key)
+            return {"success": True, "transcript": cached_transcript}
+    
+    # Run outside the lock: other sessions must not wait on this transcription
+    result = _run_transcription_task(
+        client, model_name, uploaded_file, metadata, num_speakers,
+        progress_callback, chunk_callback
+    )
+    # Failures are never cached, so a retry reaches the API again
+    if result["success"]:
+        with _transcript_cache_lock:
+            _transcript_cache[cache_key] = result["transcript"]
+            _transcript_cache.move_to_end(cache_key)
+            while len(_transcript_cache) > TRANSCRIPT_CACHE_MAX_ENTRIES:
+                _transcript_cache.popitem(last=False)
+    return result
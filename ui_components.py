@@ -6,17 +6,18 @@ import streamlit as st
 import os
 from typing import Optional, Tuple, Dict, Any
 
-from streamlit_ace import st_ace
-
-from config import GEMINI_MODELS, DEFAULT_MODEL, EXPORT_FORMATS
-from styles import format_transcript_line
+from config import (
+    GEMINI_MODELS, DEFAULT_MODEL, EXPORT_FORMATS, EXPORT_CACHE_MAX_ENTRIES,
+    TRANSCRIPT_HTML_CACHE_MAX_ENTRIES, TRANSCRIPT_PREVIEW_LINES
+)
+from styles import format_transcript_block
 
 
 def render_model_selection() -> str:
     """Render model selection UI and return selected model ID."""
     with st.container():
         st.markdown("<div class='styled-container'>", unsafe_allow_html=True)
-        st.markdown("<h4 style='margin-bottom: 10px;'>Select Transcription Model</h4>", unsafe_allow_html=True)
+        st.markdown("<h4>Select Transcription Model</h4>", unsafe_allow_html=True)
         
         # Get available model options
         model_options = list(GEMINI_MODELS.keys())
@@ -101,7 +102,7 @@ def render_file_upload() -> Tuple[Optional[Any], bool]:
     """Render file upload section and return uploaded file and process button state."""
     with st.container():
         st.markdown("<div class='styled-container'>", unsafe_allow_html=True)
-        st.markdown("<h4 style='margin-bottom: 10px;'>Upload Your Audio File</h4>", unsafe_allow_html=True)
+        st.markdown("<h4>Upload Your Audio File</h4>", unsafe_allow_html=True)
         st.caption("Supported formats: MP3, WAV, OGG (max 200MB)")
         
         uploaded_file = st.file_uploader(
@@ -152,24 +153,49 @@ def render_transcript_tabs(transcript_text: str, uploaded_file_name: str):
         render_export_options(uploaded_file_name)
 
 
+@st.cache_data(show_spinner=False, max_entries=TRANSCRIPT_HTML_CACHE_MAX_ENTRIES)
+def _render_transcript_html(transcript_text: str, max_lines: Optional[int] = None) -> Tuple[str, int]:
+    """
+    Build the styled transcript HTML; cached on the transcript text.
+    
+    Returns:
+        Tuple of (HTML for at most max_lines lines, total number of lines)
+    """
+    return format_transcript_block(transcript_text, max_lines)
+
+
 def render_transcript_display(transcript_text: str):
     """Render the transcript display tab."""
     st.markdown("### Transcript")
     with st.container():
         st.markdown("<div class='styled-container transcript-container'>", unsafe_allow_html=True)
-        formatted_lines = []
         
-        for line in transcript_text.split('\n'):
-            if line.strip():
-                formatted_lines.append(format_transcript_line(line))
+        # Long transcripts are previewed; the full HTML is only sent on request
+        show_all = st.session_state.get("show_full_transcript", False)
+        max_lines = None if show_all else TRANSCRIPT_PREVIEW_LINES
+        transcript_html, total_lines = _render_transcript_html(transcript_text, max_lines)
+        st.markdown(transcript_html, unsafe_allow_html=True)
         
-        formatted_transcript = '<p>' + '</p><p>'.join(formatted_lines) + '</p>'
-        st.markdown(formatted_transcript, unsafe_allow_html=True)
+        if total_lines > TRANSCRIPT_PREVIEW_LINES:
+            if not show_all:
+                st.caption(f"Showing the first {TRANSCRIPT_PREVIEW_LINES} of {total_lines} lines.")
+            st.toggle("Show full transcript", key="show_full_transcript")
         st.markdown("</div>", unsafe_allow_html=True)
 
 
+def _reseed_advanced_editor(text: str) -> None:
+    """Make the advanced editor remount showing the given text."""
+    st.session_state.transcript_editor_seed = text
+    st.session_state.transcript_editor_generation += 1
+
+
+@st.fragment
 def render_transcript_editor():
-    """Render the transcript editor tab."""
+    """
+    Render the transcript editor tab.
+    
+    Runs as a fragment, so editor interactions rerun only this tab.
+    """
     st.markdown("### Edit Transcript")
     
     # Initialize editor content if empty
@@ -179,31 +205,86 @@ def render_transcript_editor():
             st.session_state.get("transcript_text", "")
         )
     
-    edited_text = st_ace(
-        value=st.session_state.transcript_editor_content, 
-        language='text',
-        theme='tomorrow_night',
-        keybinding='vscode',
-        font_size=14,
-        tab_size=4,
-        show_gutter=True,
-        show_print_margin=False,
-        wrap=True,
-        auto_update=False,
-        readonly=False,
-        height=400,
-        key="transcript_editor_widget"
+    # The advanced editor is seeded per transcript, and again after a save or
+    # an edit in the plain editor. Each new seed gets a new widget key so the
+    # component remounts with it; passing the same value and key on other
+    # reruns keeps the browser's own buffer instead of resending the transcript.
+    if st.session_state.get("transcript_editor_seed") is None:
+        _reseed_advanced_editor(st.session_state.transcript_editor_content)
+        # A new transcript replaces whatever the plain editor was holding
+        st.session_state.pop("transcript_text_area", None)
+    
+    use_ace = st.toggle(
+        "Advanced editor",
+        key="use_advanced_editor",
+        help="Code editor with line numbers; slower to load for long transcripts"
     )
     
+    if use_ace:
+        # Only needed when asked for, so kept off the default path
+        from streamlit_ace import st_ace
+        
+        edited_text = st_ace(
+            value=st.session_state.transcript_editor_seed, 
+            language='text',
+            theme='tomorrow_night',
+            keybinding='vscode',
+            font_size=14,
+            tab_size=4,
+            show_gutter=True,
+            show_print_margin=False,
+            wrap=True,
+            auto_update=False,
+            readonly=False,
+            height=400,
+            key=f"transcript_editor_widget_{st.session_state.transcript_editor_generation}"
+        )
+        # Seeds the plain editor if it is switched back to before saving
+        st.session_state.transcript_editor_content = edited_text
+    else:
+        # The native text area keeps its value in session state under its key,
+        # so reruns do not remount a component around the whole transcript.
+        # Streamlit drops the key while the advanced editor is shown instead.
+        if "transcript_text_area" not in st.session_state:
+            st.session_state.transcript_text_area = st.session_state.transcript_editor_content
+        edited_text = st.text_area(
+            "Edit Transcript",
+            key="transcript_text_area",
+            height=400,
+            label_visibility="collapsed"
+        )
+        if edited_text != st.session_state.transcript_editor_seed:
+            _reseed_advanced_editor(edited_text)
+    
     # Save button
     if st.button("Save Edits", key="save_edits_button"):
         st.session_state.edited_transcript = edited_text
         st.session_state.transcript_editor_content = edited_text
+        _reseed_advanced_editor(edited_text)
+        st.session_state.edits_saved_notice = True
+        # The export tab is a separate fragment; rerun the whole app so it
+        # exports the saved text
+        st.rerun()
+    
+    if st.session_state.edits_saved_notice:
+        st.session_state.edits_saved_notice = False
         st.success("Edits saved!")
 
 
+@st.cache_data(show_spinner=False, max_entries=EXPORT_CACHE_MAX_ENTRIES)
+def _format_export(content: str, export_format: str) -> str:
+    """Format transcript content for export; cached per (content, format) pair."""
+    from transcript_utils import format_transcript_for_export
+    return format_transcript_for_export(content, format=export_format)
+
+
+@st.fragment
 def render_export_options(uploaded_file_name: str):
-    """Render the export options tab."""
+    """
+    Render the export options tab.
+    
+    Runs as a fragment, so changing the export format reruns only this tab.
+    """
     st.markdown("### Export Transcript")
     
     with st.container():
@@ -231,11 +312,7 @@ def render_export_options(uploaded_file_name: str):
         )
         
         # Format content for export
-        from transcript_utils import format_transcript_for_export
-        formatted_content = format_transcript_for_export(
-            export_content, 
-            format=format_info["extension"]
-        )
+        formatted_content = _format_export(export_content, format_info["extension"])
         
         # Generate filename
         base_filename = os.path.splitext(uploaded_file_name)[0]